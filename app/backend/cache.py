@@ -0,0 +1,56 @@
+# backend/cache.py
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from cachetools import TTLCache
+
+
+class VersionedCache:
+    """Кэш результатов запросов в памяти процесса с TTL и версиями.
+
+    Значение хранится вместе с версией данных, из которых оно получено.
+    Если текущая версия отличается от сохранённой, значение загружается
+    заново; TTL ограничивает срок жизни на случай изменений, не отражённых
+    в версии. Одновременные промахи по одному ключу разделяют одну загрузку.
+    """
+
+    def __init__(self, ttl: float = 300.0, maxsize: int = 256):
+        self._values: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._loading: Dict[Tuple[Hashable, Any], asyncio.Future] = {}
+
+    async def get(self, key: Hashable, version: Any, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Возвращает значение для key актуальной версии, при необходимости вызывая loader"""
+        cached = self._values.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        pending = self._loading.get((key, version))
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[(key, version)] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим; без них future не должен ругаться
+            future.exception()
+            raise
+        else:
+            self._values[key] = (version, value)
+            future.set_result(value)
+            return value
+        finally:
+            del self._loading[(key, version)]
+
+    def invalidate(self):
+        """Сбрасывает все сохранённые значения"""
+        self._values.clear()
+
+    def __len__(self) -> int:
+        return len(self._values)
@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Query
-from typing import Optional, List
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Literal, Optional, List
 from datetime import datetime, timedelta
+import asyncio
+import hashlib
+import json
 import logging
-from app.backend.db.database import get_mentions, Platform, get_active_sources, get_active_keywords
+from app.backend.cache import VersionedCache
+from app.backend.db.database import get_mentions, get_mentions_page, Platform, get_active_sources, get_active_keywords, search_mentions, get_stats, get_data_versions, to_timestamp
+from app.backend.export import COMPRESSIONS, FORMATS, ZSTD_AVAILABLE, export_filename, export_mentions
 
 # Настройка логирования
 logger = logging.getLogger("dashboard")
@@ -16,57 +22,222 @@ if not logger.hasHandlers():
 
 router = APIRouter()
 
+# Источники и ключевые слова почти не меняются: держим их в памяти
+# и перечитываем, только когда меняется их счётчик в data_versions
+LOOKUP_CACHE_TTL = 300
+lookup_cache = VersionedCache(ttl=LOOKUP_CACHE_TTL)
+
+
+def make_etag(versions: dict, params: dict) -> str:
+    """ETag ответа: зависит только от версий данных и параметров запроса"""
+    payload = json.dumps([versions, params], sort_keys=True, ensure_ascii=False)
+    return f'W/"{hashlib.blake2b(payload.encode("utf-8"), digest_size=12).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверяет заголовок If-None-Match (слабое сравнение)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
+
+
 @router.get("/dashboard_data")
 async def dashboard_data(
+    request: Request,
+    response: Response,
     platform: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     source_id: Optional[str] = None,
     limit: int = Query(default=100, ge=1, le=1000),
-    offset: int = Query(default=0, ge=0)
+    offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = None,
+    direction: Literal["next", "prev"] = "next"
 ):
-    # Если даты не указаны, берем последние 7 дней
+    # Если даты не указаны, берем последние 7 дней. Границы округляются до
+    # минуты, чтобы повторные запросы в течение минуты получали тот же ETag
+    now = datetime.now().replace(second=0, microsecond=0)
     if not start_date:
-        start_date = (datetime.now() - timedelta(days=7)).isoformat()
+        start_date = (now - timedelta(days=7)).isoformat()
     if not end_date:
-        end_date = datetime.now().isoformat()
+        end_date = (now + timedelta(minutes=1)).isoformat()
 
-    logger.info(f"Получение данных с параметрами: platform={platform}, start_date={start_date}, end_date={end_date}, source_id={source_id}")
+    filters = {
+        "platform": platform,
+        "start_date": start_date,
+        "end_date": end_date,
+        "source_id": source_id,
+        "limit": limit,
+        "offset": offset,
+        "cursor": cursor,
+        "direction": direction
+    }
 
-    # Получаем упоминания с фильтрацией
-    mentions = await get_mentions(
-        platform=Platform(platform) if platform else None,
-        start_date=start_date,
-        end_date=end_date,
-        source_id=source_id,
-        limit=limit,
-        offset=offset
-    )
+    # Если данные не менялись с прошлого ответа клиенту, обходимся без запросов
+    versions = await get_data_versions()
+    etag = make_etag(versions, filters)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
 
-    logger.info(f"Получено упоминаний: {len(mentions)}")
+    logger.info(f"Получение данных с параметрами: platform={platform}, start_date={start_date}, end_date={end_date}, source_id={source_id}")
 
-    # Получаем активные источники
-    sources = await get_active_sources(
-        platform=Platform(platform) if platform else None
-    )
+    platform_filter = Platform(platform) if platform else None
+
+    # Получаем упоминания с фильтрацией. По умолчанию - постранично по курсору;
+    # offset оставлен для старых клиентов
+    if offset and not cursor:
+        mentions_query = get_mentions(
+            platform=platform_filter,
+            start_date=start_date,
+            end_date=end_date,
+            source_id=source_id,
+            limit=limit,
+            offset=offset
+        )
+    else:
+        mentions_query = get_mentions_page(
+            platform=platform_filter,
+            start_date=start_date,
+            end_date=end_date,
+            source_id=source_id,
+            limit=limit,
+            cursor=cursor,
+            backward=direction == "prev"
+        )
 
-    logger.info(f"Получено источников: {len(sources)}")
+    # Упоминания, источники и ключевые слова запрашиваются одновременно
+    try:
+        result, sources, keywords = await asyncio.gather(
+            mentions_query,
+            lookup_cache.get(
+                ("sources", platform), versions["sources"],
+                lambda: get_active_sources(platform=platform_filter)
+            ),
+            lookup_cache.get(("keywords",), versions["keywords"], get_active_keywords)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # Получаем активные ключевые слова
-    keywords = await get_active_keywords()
+    next_cursor = prev_cursor = None
+    if isinstance(result, dict):
+        mentions = result["mentions"]
+        next_cursor = result["next_cursor"]
+        prev_cursor = result["prev_cursor"]
+    else:
+        mentions = result
 
-    logger.info(f"Получено ключевых слов: {len(keywords)}")
+    logger.info(f"Получено упоминаний: {len(mentions)}, источников: {len(sources)}, ключевых слов: {len(keywords)}")
 
     return {
         "mentions": mentions,
         "sources": sources,
         "keywords": keywords,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+        "filters": filters
+    }
+
+@router.get("/search")
+async def search(
+    q: str = Query(min_length=1),
+    platform: Optional[str] = None,
+    limit: int = Query(default=50, ge=1, le=500)
+):
+    logger.info(f"Поиск упоминаний: q={q}, platform={platform}")
+
+    try:
+        results = await search_mentions(
+            q,
+            platform=Platform(platform) if platform else None,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.info(f"Найдено упоминаний: {len(results)}")
+
+    return {
+        "results": results,
+        "query": q,
+        "platform": platform,
+        "limit": limit
+    }
+
+@router.get("/stats")
+async def stats(
+    granularity: Literal["hour", "day"] = "day",
+    platform: Optional[str] = None,
+    source_id: Optional[str] = None,
+    keyword: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    group_by: Optional[Literal["platform", "source_id", "keyword"]] = None
+):
+    # Если даты не указаны, берем последние 7 дней
+    if not start_date:
+        start_date = (datetime.now() - timedelta(days=7)).isoformat()
+    if not end_date:
+        end_date = datetime.now().isoformat()
+
+    logger.info(f"Получение статистики: granularity={granularity}, platform={platform}, keyword={keyword}, group_by={group_by}")
+
+    try:
+        series = await get_stats(
+            granularity,
+            platform=Platform(platform) if platform else None,
+            source_id=source_id,
+            keyword=keyword,
+            start_date=start_date,
+            end_date=end_date,
+            group_by=group_by
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "series": series,
         "filters": {
+            "granularity": granularity,
             "platform": platform,
+            "source_id": source_id,
+            "keyword": keyword,
             "start_date": start_date,
             "end_date": end_date,
-            "source_id": source_id,
-            "limit": limit,
-            "offset": offset
+            "group_by": group_by
         }
     }
+
+@router.get("/export")
+async def export(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    compression: Literal["none", "gzip", "zstd"] = "none",
+    platform: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    source_id: Optional[str] = None
+):
+    # Ошибки параметров проверяем до начала потока: после первого куска статус уже не поменять
+    if compression == "zstd" and not ZSTD_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Сжатие zstd недоступно на сервере")
+    for value in (start_date, end_date):
+        if value and to_timestamp(value) is None:
+            raise HTTPException(status_code=400, detail=f"Некорректная дата: {value}")
+    try:
+        platform_filter = Platform(platform) if platform else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.info(f"Выгрузка упоминаний: format={format}, compression={compression}, platform={platform}, start_date={start_date}, end_date={end_date}, source_id={source_id}")
+
+    # Сжатый файл отдаётся как есть (без Content-Encoding), чтобы браузер его не распаковывал
+    encoding = COMPRESSIONS[compression][0]
+    media_type = f"application/{encoding}" if encoding else FORMATS[format][0]
+    return StreamingResponse(
+        export_mentions(format, compression, platform_filter, start_date, end_date, source_id),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format, compression)}"'}
+    )
@@ -0,0 +1,182 @@
+# backend/db/archive.py
+
+import asyncio
+import datetime
+import gzip
+import os
+import re
+import shutil
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+# zstd - необязательная зависимость, без неё архивы сжимаются gzip
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+ARCHIVE_DIR = "app/backend/db/archive"
+CACHE_SIZE = 4  # Сколько распакованных месяцев держать на диске
+
+_ARCHIVE_NAME = re.compile(r"^mentions-(\d{4}-\d{2})\.db\.(zst|gz)$")
+
+
+def month_bounds(month: str) -> Tuple[int, int]:
+    """Границы месяца 'YYYY-MM' в секундах UTC: [начало, начало следующего)"""
+    year, number = map(int, month.split("-"))
+    start = datetime.datetime(year, number, 1, tzinfo=datetime.timezone.utc)
+    end = datetime.datetime(year + number // 12, number % 12 + 1, 1, tzinfo=datetime.timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def month_of(ts: int) -> str:
+    return datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc).strftime("%Y-%m")
+
+
+def _compress(src: str, dst: str):
+    tmp = f"{dst}.tmp"
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        if dst.endswith(".zst"):
+            zstandard.ZstdCompressor(level=10).copy_stream(fin, fout)
+        else:
+            with gzip.GzipFile(fileobj=fout, mode="wb") as gz:
+                shutil.copyfileobj(fin, gz)
+    os.chmod(tmp, 0o444)
+    os.replace(tmp, dst)
+
+
+def _decompress(src: str, dst: str):
+    if src.endswith(".zst") and not ZSTD_AVAILABLE:
+        raise RuntimeError(f"Архив {src} сжат zstd, но пакет zstandard не установлен")
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        if src.endswith(".zst"):
+            zstandard.ZstdDecompressor().copy_stream(fin, fout)
+        else:
+            with gzip.GzipFile(fileobj=fin, mode="rb") as gz:
+                shutil.copyfileobj(gz, fout)
+    os.replace(tmp, dst)
+
+
+class MentionArchive:
+    """Холодный архив упоминаний: по сжатому файлу SQLite на календарный месяц.
+
+    Архивы только для чтения. Для запроса месяц распаковывается в
+    подкаталог .cache и открывается в режиме только чтения; на диске
+    остаются cache_size последних распакованных месяцев. Изменение архива
+    (edit) идёт на копии, которая затем сжимается и атомарно заменяет файл.
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR, cache_size: int = CACHE_SIZE):
+        self.directory = directory
+        self.cache_dir = os.path.join(directory, ".cache")
+        self.cache_size = cache_size
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def months(self) -> List[str]:
+        """Месяцы, для которых есть архив, по возрастанию"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted({match.group(1) for match in map(_ARCHIVE_NAME.match, os.listdir(self.directory)) if match})
+
+    def covering(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> List[str]:
+        """Архивные месяцы, пересекающиеся с интервалом [start_ts, end_ts]"""
+        months = []
+        for month in self.months():
+            first, last = month_bounds(month)
+            if (start_ts is None or last > start_ts) and (end_ts is None or first <= end_ts):
+                months.append(month)
+        return months
+
+    def path(self, month: str) -> Optional[str]:
+        for extension in ("zst", "gz"):
+            path = os.path.join(self.directory, f"mentions-{month}.db.{extension}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _cache_path(self, month: str) -> str:
+        return os.path.join(self.cache_dir, f"mentions-{month}.db")
+
+    def _lock(self, month: str) -> asyncio.Lock:
+        return self._locks.setdefault(month, asyncio.Lock())
+
+    def _evict(self, keep: str):
+        cached = [
+            os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+            if name.endswith(".db") and os.path.join(self.cache_dir, name) != keep
+        ]
+        cached.sort(key=os.path.getmtime, reverse=True)
+        for path in cached[self.cache_size - 1:]:
+            os.remove(path)
+
+    async def _unpack(self, month: str) -> str:
+        """Путь к распакованному месяцу; распаковывает, если копии нет или она устарела"""
+        async with self._lock(month):
+            return await self._unpack_locked(month)
+
+    async def _unpack_locked(self, month: str) -> str:
+        """_unpack для вызывающего, который уже держит блокировку месяца"""
+        archive_path = self.path(month)
+        if archive_path is None:
+            raise FileNotFoundError(f"Нет архива за {month}")
+        cache_path = self._cache_path(month)
+        if not os.path.exists(cache_path) or os.path.getmtime(cache_path) < os.path.getmtime(archive_path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            await asyncio.to_thread(_decompress, archive_path, cache_path)
+        os.utime(cache_path)  # Отметка для вытеснения давно не использованных
+        self._evict(keep=cache_path)
+        return cache_path
+
+    @asynccontextmanager
+    async def open(self, month: str):
+        """Соединение только для чтения с архивом месяца"""
+        path = await self._unpack(month)
+        db = await aiosqlite.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    @asynccontextmanager
+    async def edit(self, month: str):
+        """Соединение на запись с копией архива месяца (новой, если архива нет).
+
+        При успешном выходе копия уплотняется, сжимается и заменяет архив;
+        при ошибке архив остаётся прежним.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        work = f"{self._cache_path(month)}.edit"
+        # Копия снимается под блокировкой месяца, чтобы её не обогнала параллельная правка
+        async with self._lock(month):
+            if self.path(month):
+                await asyncio.to_thread(shutil.copyfile, await self._unpack_locked(month), work)
+            elif os.path.exists(work):
+                os.remove(work)
+
+            db = await aiosqlite.connect(work)
+            try:
+                yield db
+                await db.commit()
+                await db.execute("VACUUM")
+            except BaseException:
+                await db.close()
+                os.remove(work)
+                raise
+            await db.close()
+
+            old_path = self.path(month)
+            new_path = os.path.join(self.directory, f"mentions-{month}.db.{'zst' if ZSTD_AVAILABLE else 'gz'}")
+            await asyncio.to_thread(_compress, work, new_path)
+            if old_path and old_path != new_path:
+                os.remove(old_path)
+            os.replace(work, self._cache_path(month))
+
+    def remove(self, month: str):
+        """Удаляет архив месяца и его распакованную копию"""
+        for path in (self.path(month), self._cache_path(month)):
+            if path and os.path.exists(path):
+                os.remove(path)
@@ -1,11 +1,20 @@
 # backend/db/database.py
 
 import aiosqlite
+import asyncio
+import base64
 import datetime
+import html
+import json
 import logging
-from typing import Dict, List, Optional, Union
+import re
+import sqlite3
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Union
 from enum import Enum
 
+from .archive import MentionArchive, month_bounds
+
 # Настройка логирования
 logger = logging.getLogger("joint_db")
 logger.setLevel(logging.INFO)
@@ -25,15 +34,33 @@ logger.debug("Логгер настроен")
 
 DB_PATH = "app/backend/db/joint.db"
 
+# Холодный архив: месяцы старше HOT_MONTHS переносятся из DB_PATH в сжатые
+# файлы (см. archive_old_mentions) и читаются оттуда по запросу
+mention_archive = MentionArchive()
+
+# Параметры пула соединений
+READER_POOL_SIZE = 4
+STATEMENT_CACHE_SIZE = 256  # Кэш подготовленных выражений на одно соединение
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # 64 МиБ
+    "PRAGMA mmap_size=268435456",  # 256 МиБ
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
 class Platform(Enum):
     RSS = "rss"
     VK = "vk"
     TELEGRAM = "telegram"
 
-# Базовые поля для всех таблиц упоминаний
+# Поля упоминания, общие для всех платформ
 BASE_MENTION_FIELDS = """
     id INTEGER PRIMARY KEY AUTOINCREMENT,
+    platform TEXT NOT NULL,
     mention_datetime TEXT NOT NULL,
+    mention_ts INTEGER,
     mention_link TEXT,
     source_id TEXT,
     source_link TEXT,
@@ -41,38 +68,62 @@ BASE_MENTION_FIELDS = """
     user_name TEXT,
     user_nick TEXT,
     mention_text TEXT,
+    matched_keywords TEXT,
+    simhash INTEGER,
+    cluster_id INTEGER,
+    duplicate INTEGER DEFAULT 0,
     created_at TEXT DEFAULT CURRENT_TIMESTAMP
 """
 
-# Создание таблиц для каждого сервиса
-CREATE_TABLES_QUERIES = [
-    f"""
-    CREATE TABLE IF NOT EXISTS rss_mentions (
-        {BASE_MENTION_FIELDS},
-        feed_url TEXT,
-        entry_title TEXT,
-        entry_summary TEXT
-)
-    """,
-    f"""
-    CREATE TABLE IF NOT EXISTS vk_mentions (
-        {BASE_MENTION_FIELDS},
-        post_id TEXT,
-        group_id TEXT,
-        likes_count INTEGER DEFAULT 0,
-        reposts_count INTEGER DEFAULT 0,
-        comments_count INTEGER DEFAULT 0
-    )
-    """,
+# Поля, которые есть только у одной платформы. Хранятся в таблицах
+# расширений {platform}_mention_details, mention_id = mentions.id
+MENTION_DETAILS = {
+    Platform.RSS: {
+        "feed_url": "TEXT",
+        "entry_title": "TEXT",
+        "entry_summary": "TEXT",
+        "source_type": "TEXT",
+    },
+    Platform.VK: {
+        "post_id": "TEXT",
+        "group_id": "TEXT",
+        "source_type": "TEXT",
+        "source_name": "TEXT",
+        "likes_count": "INTEGER DEFAULT 0",
+        "reposts_count": "INTEGER DEFAULT 0",
+        "comments_count": "INTEGER DEFAULT 0",
+    },
+    Platform.TELEGRAM: {
+        "chat_id": "TEXT",
+        "message_id": "TEXT",
+        "reply_to_message_id": "TEXT",
+        "forward_from_chat_id": "TEXT",
+    },
+}
+
+# Упоминания всех платформ в одной таблице и таблицы расширений.
+# Такая же схема у месячных архивов (см. ARCHIVE_SCHEMA_QUERIES)
+MENTION_TABLES_QUERIES = [
     f"""
-    CREATE TABLE IF NOT EXISTS telegram_mentions (
-        {BASE_MENTION_FIELDS},
-        chat_id TEXT,
-        message_id TEXT,
-        reply_to_message_id TEXT,
-        forward_from_chat_id TEXT
+    CREATE TABLE IF NOT EXISTS mentions (
+        {BASE_MENTION_FIELDS}
     )
     """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_mentions_link ON mentions(platform, mention_link)",
+    *(
+        f"""
+        CREATE TABLE IF NOT EXISTS {p.value}_mention_details (
+            mention_id INTEGER PRIMARY KEY,
+            {', '.join(f'{column} {definition}' for column, definition in columns.items())}
+        )
+        """
+        for p, columns in MENTION_DETAILS.items()
+    ),
+]
+
+# Создание таблиц
+CREATE_TABLES_QUERIES = [
+    *MENTION_TABLES_QUERIES,
     """
     CREATE TABLE IF NOT EXISTS sources (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -91,47 +142,808 @@ CREATE_TABLES_QUERIES = [
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         keyword TEXT NOT NULL UNIQUE,
         is_active BOOLEAN DEFAULT 1,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Валидаторы условных HTTP-запросов для каждой RSS-ленты.
+    # Хранятся по URL ленты: в sources источник определяется доменом,
+    # а у одного домена (news.google.com) бывает много лент
+    """
+    CREATE TABLE IF NOT EXISTS feed_state (
+        feed_url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Недоставленные уведомления в Telegram. channel - имя отправителя
+    # (vk_eye, telegram_eye): у каждого процесса своя очередь
+    """
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel TEXT NOT NULL,
+        chat_id INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        summary TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
         created_at TEXT DEFAULT CURRENT_TIMESTAMP
     )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_notification_outbox_channel ON notification_outbox(channel, id)",
+    # Прогресс загрузки истории чатов Telegram: уже просмотрен диапазон
+    # сообщений [min_message_id, max_message_id]
+    """
+    CREATE TABLE IF NOT EXISTS telegram_backfill_state (
+        chat_id INTEGER PRIMARY KEY,
+        min_message_id INTEGER NOT NULL,
+        max_message_id INTEGER NOT NULL,
+        complete BOOLEAN NOT NULL DEFAULT 0,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Агрегаты упоминаний по часам и дням (см. ROLLUP_TABLES).
+    # keyword = '' - все упоминания, иначе - упоминания с этим ключевым словом
+    *(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            keyword TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            platform TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            mentions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (keyword, bucket, platform, source_id)
+        ) WITHOUT ROWID
+        """
+        for table in ("mention_rollups_hourly", "mention_rollups_daily")
+    ),
+    # Начатые удаления из архивов (purge_archive_month): вклад строк уже
+    # вычтен из агрегатов, а правка архива могла не записаться
+    """
+    CREATE TABLE IF NOT EXISTS archive_purges (
+        month TEXT NOT NULL,
+        platform TEXT NOT NULL,
+        cutoff INTEGER NOT NULL,
+        PRIMARY KEY (month, platform)
+    ) WITHOUT ROWID
+    """,
+    # Счётчики изменений данных (см. DATA_VERSION_TRIGGERS). По ним кэш
+    # справочников и ETag дашборда узнают, что данные поменялись, в том числе
+    # из другого процесса
+    """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """,
+    """
+    INSERT OR IGNORE INTO data_versions (name) VALUES ('mentions'), ('sources'), ('keywords')
+    """,
+    # Полнотекстовый индекс по текстам упоминаний всех платформ.
+    # unicode61 приводит регистр кириллицы и латиницы и убирает диакритику латиницы,
+    # ё заменяется на е при индексации (fts_text); префиксные индексы ускоряют
+    # запросы вида "газпром*" для разных словоформ
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS mentions_fts USING fts5(
+        mention_text,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '3 5'
+    )
+    """
+]
+
+# Таблицы упоминаний до перехода на общую таблицу mentions (см. migrate_platform_tables)
+LEGACY_MENTION_TABLES = {p: f"{p.value}_mentions" for p in Platform}
+
+def fts_text(column: str) -> str:
+    """SQL-выражение текста для индексации: unicode61 не сводит ё к е"""
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+def fts_normalize(text: str) -> str:
+    """То же, что fts_text, на стороне Python; длина текста не меняется"""
+    return text.replace("ё", "е").replace("Ё", "Е")
+
+# Маркеры snippet()/highlight(): символы из области частного использования,
+# которых нет в текстах упоминаний
+FTS_MARK_OPEN, FTS_MARK_CLOSE, FTS_ELLIPSIS = "\ue000", "\ue001", "\ue002"
+_FTS_MARKS = re.compile(f"([{FTS_MARK_OPEN}{FTS_MARK_CLOSE}])")
+
+def mark_matches(text: str, marked: Optional[str]) -> str:
+    """HTML-фрагмент исходного текста с <mark> вокруг совпадений.
+
+    marked - результат snippet() или highlight() по тексту индекса, где ё
+    заменена на е. Замена не меняет длину, поэтому фрагмент находится в
+    исходном тексте по позиции, а выводится исходный текст, экранированный
+    для HTML.
+    """
+    if not text or not marked:
+        return ""
+    leading = marked.startswith(FTS_ELLIPSIS)
+    trailing = marked.endswith(FTS_ELLIPSIS)
+    body = marked.strip(FTS_ELLIPSIS)
+    start = max(fts_normalize(text).find(_FTS_MARKS.sub("", body)), 0)
+    parts = ["…"] if leading else []
+    for piece in _FTS_MARKS.split(body):
+        if piece == FTS_MARK_OPEN:
+            parts.append("<mark>")
+        elif piece == FTS_MARK_CLOSE:
+            parts.append("</mark>")
+        else:
+            parts.append(html.escape(text[start:start + len(piece)]))
+            start += len(piece)
+    if trailing:
+        parts.append("…")
+    return "".join(parts)
+
+# Таблицы агрегатов: гранулярность -> (таблица, длина интервала в секундах)
+ROLLUP_TABLES = {
+    "hour": ("mention_rollups_hourly", 3600),
+    "day": ("mention_rollups_daily", 86400),
+}
+
+def keyword_key(keyword: Optional[str]) -> Optional[str]:
+    """Ключевое слово в matched_keywords и агрегатах: без учёта регистра, как в KeywordMatcher.
+
+    Встроенный lower() SQLite меняет регистр только латиницы, поэтому
+    ключевые слова приводятся к нижнему регистру до записи (prepare_mention),
+    и триггеры агрегатов берут их как есть.
+    """
+    return keyword.lower() if isinstance(keyword, str) else keyword
+
+def normalize_keywords(keywords: Iterable[str]) -> List[str]:
+    """Ключевые слова упоминания через keyword_key, без повторов, в исходном порядке"""
+    return list(dict.fromkeys(keyword_key(keyword) for keyword in keywords))
+
+def rollup_rows_sql(row: str, ts: str) -> str:
+    """SELECT строк агрегата для одного упоминания: общая строка и по строке на ключевое слово"""
+    return f"""
+        SELECT '' AS keyword, {ts} AS ts, IFNULL({row}.source_id, '') AS source_id
+        UNION ALL
+        SELECT json_each.value, {ts}, IFNULL({row}.source_id, '')
+        FROM json_each(IFNULL({row}.matched_keywords, '[]'))
+    """
+
+# Колонки, добавленные после первой версии схемы (для уже существующих БД)
+ADDED_COLUMNS = {
+    "keywords": {"updated_at": "TEXT"},
+}
+
+# Колонки mentions в порядке выборки (row_to_mention)
+MENTION_COLUMNS = (
+    "id", "platform", "mention_datetime", "mention_ts", "mention_link", "source_id", "source_link",
+    "user_id", "user_name", "user_nick", "mention_text", "matched_keywords",
+    "simhash", "cluster_id", "duplicate", "created_at"
+)
+
+# Колонки, которые заполняются при записи упоминания
+MENTION_INSERT_COLUMNS = tuple(column for column in MENTION_COLUMNS if column not in ("id", "platform", "created_at"))
+
+# mention_ts - время упоминания в секундах UTC. mention_datetime хранится в ISO
+# с разными смещениями (RSS пишет UTC, Telegram - смещение из msg.date), поэтому
+# сортировать и фильтровать по тексту нельзя. Индексы по mention_ts неявно
+# содержат id, поэтому сортировка (mention_ts, id) идёт по индексу
+CREATE_INDEXES_QUERIES = [
+    "CREATE INDEX IF NOT EXISTS idx_mentions_ts ON mentions(mention_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_mentions_platform_ts ON mentions(platform, mention_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_mentions_source_ts ON mentions(source_id, mention_ts)",
+    "CREATE INDEX IF NOT EXISTS idx_mentions_cluster ON mentions(cluster_id)",
+]
+
+# Схема месячного архива: те же таблицы упоминаний без триггеров,
+# агрегатов и полнотекстового индекса (они остаются в горячей БД)
+ARCHIVE_SCHEMA_QUERIES = [
+    *MENTION_TABLES_QUERIES,
+    *(query for query in CREATE_INDEXES_QUERIES if "cluster_id" not in query),
+]
+ARCHIVE_BATCH_SIZE = 1000
+HOT_MONTHS = 3  # Сколько последних месяцев (включая текущий) остаются в горячей БД
+
+# Версия данных в PRAGMA user_version: 1 - ключевые слова в matched_keywords
+# приведены к нижнему регистру
+SCHEMA_VERSION = 1
+
+# Триггеры агрегатов; их текст менялся, поэтому они пересоздаются при каждом init_db
+ROLLUP_TRIGGERS = [
+    f"mentions_rollup_{event}_{granularity}"
+    for granularity in ROLLUP_TABLES
+    for event in ("insert", "delete")
+]
+
+# Триггеры (создаются после добавления недостающих колонок)
+CREATE_TRIGGERS_QUERIES = [
+    # Любое изменение ключевого слова обновляет updated_at, по которому
+    # KeywordRegistry замечает, что набор слов поменялся
+    """
+    CREATE TRIGGER IF NOT EXISTS keywords_touch_updated_at
+    AFTER UPDATE ON keywords
+    WHEN NEW.updated_at IS OLD.updated_at
+    BEGIN
+        UPDATE keywords SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = NEW.id;
+    END
+    """,
+    # Страховка для записей, вставленных без mention_ts
+    """
+    CREATE TRIGGER IF NOT EXISTS mentions_fill_ts
+    AFTER INSERT ON mentions
+    WHEN NEW.mention_ts IS NULL
+    BEGIN
+        UPDATE mentions
+        SET mention_ts = CAST(strftime('%s', NEW.mention_datetime) AS INTEGER)
+        WHERE id = NEW.id;
+    END
+    """,
+    # Удаление упоминания удаляет и его строку в таблице расширения
+    f"""
+    CREATE TRIGGER IF NOT EXISTS mentions_delete_details
+    AFTER DELETE ON mentions
+    BEGIN
+        {' '.join(f"DELETE FROM {p.value}_mention_details WHERE OLD.platform = '{p.value}' AND mention_id = OLD.id;" for p in Platform)}
+    END
+    """,
+] + [
+    # Агрегаты обновляются в той же транзакции, что и запись упоминания
+    f"""
+    CREATE TRIGGER IF NOT EXISTS mentions_rollup_{event.lower()}_{granularity}
+    AFTER {event} ON mentions
+    BEGIN
+        INSERT INTO {table} (keyword, bucket, platform, source_id, mentions)
+        SELECT keyword, ts / {size} * {size}, {row}.platform, source_id, {delta}
+        FROM ({rollup_rows_sql(row, f"COALESCE({row}.mention_ts, CAST(strftime('%s', {row}.mention_datetime) AS INTEGER))")})
+        WHERE ts IS NOT NULL
+        ON CONFLICT (keyword, bucket, platform, source_id) DO UPDATE SET mentions = mentions + excluded.mentions;
+    END
+    """
+    for granularity, (table, size) in ROLLUP_TABLES.items()
+    for event, row, delta in (("INSERT", "NEW", 1), ("DELETE", "OLD", -1))
+] + [
+    # Любая запись в таблицу увеличивает её счётчик в data_versions
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+    AFTER {event} ON {table}
+    BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+    END
+    """
+    for table in ("sources", "keywords", "mentions")
+    for event in ("INSERT", "UPDATE", "DELETE")
+] + [
+    # Синхронизация полнотекстового индекса с упоминаниями: rowid = mentions.id
+    f"""
+    CREATE TRIGGER IF NOT EXISTS mentions_fts_insert
+    AFTER INSERT ON mentions
+    BEGIN
+        INSERT INTO mentions_fts (rowid, mention_text) VALUES (NEW.id, {fts_text('NEW.mention_text')});
+    END
+    """,
     """
+    CREATE TRIGGER IF NOT EXISTS mentions_fts_delete
+    AFTER DELETE ON mentions
+    BEGIN
+        DELETE FROM mentions_fts WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS mentions_fts_update
+    AFTER UPDATE OF mention_text ON mentions
+    BEGIN
+        UPDATE mentions_fts SET mention_text = {fts_text('NEW.mention_text')} WHERE rowid = NEW.id;
+    END
+    """,
 ]
 
+# Для пакетных запросов с IN (...): не упираемся в лимит параметров SQLite
+IN_QUERY_CHUNK_SIZE = 500
+
+class ConnectionPool:
+    """Пул долгоживущих соединений: один писатель и несколько читателей.
+
+    В режиме WAL читатели не блокируют писателя, поэтому запросы дашборда
+    не мешают записи упоминаний.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, readers: int = READER_POOL_SIZE):
+        self.db_path = db_path
+        self.readers_count = readers
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._connections: List[aiosqlite.Connection] = []
+
+    async def _connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        # isolation_level=None: транзакциями управляем явно
+        db = await aiosqlite.connect(
+            self.db_path,
+            isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        for pragma in SQLITE_PRAGMAS:
+            await db.execute(pragma)
+        if read_only:
+            await db.execute("PRAGMA query_only=ON")
+        self._connections.append(db)
+        return db
+
+    async def open(self):
+        """Открывает соединения пула"""
+        # Писатель открывается первым: он создаёт файл БД и включает WAL
+        self._writer = await self._connect()
+        for _ in range(self.readers_count):
+            self._readers.put_nowait(await self._connect(read_only=True))
+        logger.info(f"Пул соединений открыт (читателей: {self.readers_count})")
+
+    async def close(self):
+        """Закрывает все соединения пула"""
+        for db in self._connections:
+            try:
+                await db.close()
+            except Exception as e:
+                logger.error(f"Ошибка при закрытии соединения: {e}")
+        self._connections.clear()
+        self._writer = None
+        self._readers = asyncio.Queue()
+        logger.info("Пул соединений закрыт")
+
+    @asynccontextmanager
+    async def writer(self):
+        """Выдаёт единственное соединение на запись внутри транзакции"""
+        async with self._writer_lock:
+            await self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            else:
+                await self._writer.commit()
+
+    async def vacuum(self):
+        """Пересобирает файл БД, возвращая место удалённых строк (VACUUM вне транзакции)"""
+        async with self._writer_lock:
+            await self._writer.execute("VACUUM")
+
+    @asynccontextmanager
+    async def reader(self):
+        """Выдаёт свободное соединение на чтение"""
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def dedicated_reader(self):
+        """Отдельное соединение на чтение для долгих выгрузок, не занимающее пул"""
+        db = await self._connect(read_only=True)
+        try:
+            yield db
+        finally:
+            self._connections.remove(db)
+            await db.close()
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = asyncio.Lock()
+
+async def get_pool() -> ConnectionPool:
+    """Возвращает общий пул соединений, открывая его при первом обращении"""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(DB_PATH)
+                await pool.open()
+                _pool = pool
+    return _pool
+
+@asynccontextmanager
+async def writer_connection():
+    """Соединение на запись из общего пула"""
+    pool = await get_pool()
+    async with pool.writer() as db:
+        yield db
+
+@asynccontextmanager
+async def reader_connection():
+    """Соединение на чтение из общего пула"""
+    pool = await get_pool()
+    async with pool.reader() as db:
+        yield db
+
+@asynccontextmanager
+async def dedicated_reader_connection():
+    """Отдельное соединение на чтение вне пула (для выгрузок)"""
+    pool = await get_pool()
+    async with pool.dedicated_reader() as db:
+        yield db
+
+async def vacuum_db():
+    """VACUUM общей БД"""
+    pool = await get_pool()
+    await pool.vacuum()
+    logger.info("БД уплотнена (VACUUM)")
+
+async def table_columns(db: aiosqlite.Connection, table: str) -> List[str]:
+    """Колонки таблицы; пустой список, если таблицы нет"""
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in await cursor.fetchall()]
+
+async def add_missing_columns(db: aiosqlite.Connection):
+    """Добавляет в существующие таблицы колонки из ADDED_COLUMNS"""
+    for table, columns in ADDED_COLUMNS.items():
+        existing = await table_columns(db, table)
+        for column, definition in columns.items():
+            if column not in existing:
+                await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                logger.info(f"В таблицу {table} добавлена колонка {column}")
+
+def rollup_counts_sql(size: int, where: str = "1") -> str:
+    """SELECT строк агрегата с интервалом size по упоминаниям, подходящим под where.
+
+    where встречается в запросе дважды, поэтому параметры передаются
+    дважды; колонки в нём указываются как mentions.колонка.
+    """
+    return f"""
+        SELECT keyword, ts / {size} * {size}, platform, source_id, COUNT(*)
+        FROM (
+            SELECT '' AS keyword, mention_ts AS ts, platform, IFNULL(source_id, '') AS source_id
+            FROM mentions
+            WHERE {where}
+            UNION ALL
+            SELECT json_each.value, mention_ts, platform, IFNULL(source_id, '')
+            FROM mentions, json_each(IFNULL(matched_keywords, '[]'))
+            WHERE {where}
+        )
+        WHERE ts IS NOT NULL
+        GROUP BY keyword, ts / {size} * {size}, platform, source_id
+    """
+
+async def add_rollup_counts(db: aiosqlite.Connection, table: str, rows: List[tuple], sign: int = 1):
+    """Прибавляет (или, при sign=-1, вычитает) строки rollup_counts_sql к агрегату"""
+    await db.executemany(f"""
+        INSERT INTO {table} (keyword, bucket, platform, source_id, mentions)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (keyword, bucket, platform, source_id)
+        DO UPDATE SET mentions = mentions + excluded.mentions
+    """, [(*row[:4], sign * row[4]) for row in rows])
+
+async def fill_rollups(db: aiosqlite.Connection) -> int:
+    """Заново заполняет таблицы агрегатов по упоминаниям"""
+    total = 0
+    for table, size in ROLLUP_TABLES.values():
+        await db.execute(f"DELETE FROM {table}")
+        cursor = await db.execute(f"""
+            INSERT INTO {table} (keyword, bucket, platform, source_id, mentions)
+            {rollup_counts_sql(size)}
+        """)
+        total += cursor.rowcount
+    return total
+
+async def archive_rollup_counts(
+    archive: aiosqlite.Connection, size: int, where: str = "1", params: Sequence = ()
+) -> List[tuple]:
+    """rollup_counts_sql по архиву месяца.
+
+    В архивах могут лежать упоминания, записанные до приведения ключевых
+    слов к нижнему регистру, поэтому строки сводятся по keyword_key здесь.
+    """
+    rows = await (await archive.execute(rollup_counts_sql(size, where), [*params, *params])).fetchall()
+    merged: Dict[tuple, int] = {}
+    for keyword, bucket, platform, source_id, count in rows:
+        key = (keyword_key(keyword), bucket, platform, source_id)
+        merged[key] = merged.get(key, 0) + count
+    return [(*key, count) for key, count in merged.items()]
+
+async def fill_all_rollups(db: aiosqlite.Connection) -> int:
+    """Заново заполняет таблицы агрегатов по горячей БД и архивам"""
+    total = await fill_rollups(db)
+    for month in mention_archive.months():
+        async with mention_archive.open(month) as archive:
+            for table, size in ROLLUP_TABLES.values():
+                rows = await archive_rollup_counts(archive, size)
+                await add_rollup_counts(db, table, rows)
+                total += len(rows)
+    return total
+
+async def fill_search_index(db: aiosqlite.Connection) -> int:
+    """Заново заполняет mentions_fts по упоминаниям"""
+    await db.execute("DELETE FROM mentions_fts")
+    cursor = await db.execute(f"""
+        INSERT INTO mentions_fts (rowid, mention_text)
+        SELECT id, {fts_text('mention_text')} FROM mentions
+    """)
+    await db.execute("INSERT INTO mentions_fts (mentions_fts) VALUES ('optimize')")
+    return cursor.rowcount
+
+async def rebuild_rollups() -> int:
+    """Пересчитывает таблицы агрегатов по сырым упоминаниям горячей БД и архивов"""
+    async with writer_connection() as db:
+        total = await fill_all_rollups(db)
+    logger.info(f"Агрегаты упоминаний пересчитаны: {total} строк")
+    return total
+
+async def migrate_platform_tables(db: aiosqlite.Connection) -> int:
+    """Переносит упоминания из старых таблиц {platform}_mentions в mentions.
+
+    Общие поля копируются в mentions, поля платформы - в её таблицу
+    расширения, затем старая таблица удаляется. Копирование идёт одним
+    INSERT ... SELECT на таблицу; id сдвигаются, чтобы не пересекаться с
+    упоминаниями других платформ. Агрегаты и полнотекстовый индекс после
+    переноса строятся заново, потому что в старых таблицах они ссылались на
+    старые id.
+    """
+    moved = 0
+    for p, legacy_table in LEGACY_MENTION_TABLES.items():
+        legacy_columns = await table_columns(db, legacy_table)
+        if not legacy_columns:
+            continue
+        # created_at переносится как есть: по нему прогревается индекс ссылок (iter_recent_links)
+        columns = [column for column in (*MENTION_INSERT_COLUMNS, "created_at") if column in legacy_columns]
+        details = [column for column in MENTION_DETAILS[p] if column in legacy_columns]
+
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM mentions")
+        (offset,) = await cursor.fetchone()
+        cursor = await db.execute(f"""
+            INSERT OR IGNORE INTO mentions (id, platform, {', '.join(columns)})
+            SELECT id + ?, ?, {', '.join(columns)} FROM {legacy_table} ORDER BY id
+        """, (offset, p.value))
+        moved += cursor.rowcount
+        if details:
+            await db.execute(f"""
+                INSERT OR IGNORE INTO {p.value}_mention_details (mention_id, {', '.join(details)})
+                SELECT id + ?, {', '.join(details)} FROM {legacy_table}
+                WHERE id + ? IN (SELECT id FROM mentions)
+                  AND ({' OR '.join(f'{column} IS NOT NULL' for column in details)})
+            """, (offset, offset))
+        await db.execute(f"DROP TABLE {legacy_table}")
+        logger.info(f"Упоминания из {legacy_table} перенесены в mentions: {cursor.rowcount}")
+
+    if moved:
+        await backfill_mention_timestamps(db)
+        await fill_rollups(db)
+        await fill_search_index(db)
+    return moved
+
+async def normalize_matched_keywords(db: aiosqlite.Connection) -> int:
+    """Приводит matched_keywords сохранённых упоминаний к normalize_keywords"""
+    updates = []
+    async with db.execute("""
+        SELECT id, matched_keywords FROM mentions
+        WHERE matched_keywords IS NOT NULL AND matched_keywords != '[]'
+    """) as cursor:
+        while rows := await cursor.fetchmany(ARCHIVE_BATCH_SIZE):
+            for mention_id, matched_keywords in rows:
+                normalized = json.dumps(normalize_keywords(json.loads(matched_keywords)), ensure_ascii=False)
+                if normalized != matched_keywords:
+                    updates.append((normalized, mention_id))
+    await db.executemany("UPDATE mentions SET matched_keywords = ? WHERE id = ?", updates)
+    if updates:
+        logger.info(f"В таблице mentions ключевые слова приведены к нижнему регистру: {len(updates)}")
+    return len(updates)
+
+async def backfill_mention_timestamps(db: aiosqlite.Connection):
+    """Заполняет mention_ts у записей, сохранённых без него"""
+    cursor = await db.execute("""
+        UPDATE mentions
+        SET mention_ts = CAST(strftime('%s', mention_datetime) AS INTEGER)
+        WHERE mention_ts IS NULL
+    """)
+    if cursor.rowcount:
+        logger.info(f"В таблице mentions заполнено mention_ts: {cursor.rowcount}")
+
 async def init_db():
     """Инициализирует базу данных и создаёт все необходимые таблицы"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with writer_connection() as db:
         for query in CREATE_TABLES_QUERIES:
             await db.execute(query)
-        await db.commit()
+        await add_missing_columns(db)
+        await migrate_platform_tables(db)
+        await backfill_mention_timestamps(db)
+        for query in CREATE_INDEXES_QUERIES:
+            await db.execute(query)
+        for name in ROLLUP_TRIGGERS:
+            await db.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for query in CREATE_TRIGGERS_QUERIES:
+            await db.execute(query)
+        (version,) = await (await db.execute("PRAGMA user_version")).fetchone()
+        if version < SCHEMA_VERSION:
+            # Упоминания и агрегаты, записанные до приведения ключевых слов к одному регистру
+            await normalize_matched_keywords(db)
+            await fill_all_rollups(db)
+            await db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    await finish_archive_purges()
     logger.info("База данных инициализирована")
 
+async def close_db():
+    """Закрывает пул соединений"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+def to_timestamp(value: Optional[str]) -> Optional[int]:
+    """Переводит дату ISO 8601 в секунды UTC; дата без часового пояса считается UTC"""
+    if not value:
+        return None
+    try:
+        dt = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int(dt.timestamp())
+
+def prepare_mention(mention_data: Dict) -> Dict:
+    """Приводит данные упоминания к виду для записи.
+
+    Добавляет нормализованное время mention_ts и сериализует список
+    найденных ключевых слов (в нижнем регистре, см. keyword_key) в JSON.
+    """
+    mention_data = dict(mention_data)
+    if "mention_ts" not in mention_data:
+        mention_data["mention_ts"] = to_timestamp(mention_data.get("mention_datetime"))
+    if isinstance(mention_data.get("matched_keywords"), (list, tuple)):
+        mention_data["matched_keywords"] = json.dumps(normalize_keywords(mention_data["matched_keywords"]), ensure_ascii=False)
+    return mention_data
+
 async def insert_mention(platform: Platform, mention_data: Dict):
-    """Вставляет упоминания в соответствующую платформе таблицу"""
-    table_name = f"{platform.value}_mentions"
-    
-    # Формируем список полей и значений для вставки
-    fields = []
-    values = []
-    placeholders = []
-    
-    for field, value in mention_data.items():
-        fields.append(field)
-        values.append(value)
-        placeholders.append("?")
-    
-    query = f"""
-    INSERT INTO {table_name} ({', '.join(fields)})
-    VALUES ({', '.join(placeholders)})
+    """Вставляет одно упоминание платформы"""
+    await insert_mentions(platform, [mention_data])
+
+def split_details(platform: Platform, mention_data: Dict) -> tuple:
+    """Делит упоминание на поля mentions и поля таблицы расширения платформы"""
+    mention_data = prepare_mention(mention_data)
+    fields = {column: mention_data[column] for column in MENTION_INSERT_COLUMNS if column in mention_data}
+    details = {column: mention_data[column] for column in MENTION_DETAILS[platform] if column in mention_data}
+    return fields, details
+
+async def insert_mention_details(db: aiosqlite.Connection, platform: Platform, rows: List[tuple]):
+    """Записывает поля расширения (mention_id, details) пачкой"""
+    groups: Dict[tuple, List[tuple]] = {}
+    for mention_id, details in rows:
+        if details:
+            groups.setdefault(tuple(details), []).append((mention_id, *details.values()))
+    for columns, values in groups.items():
+        await db.executemany(f"""
+            INSERT OR REPLACE INTO {platform.value}_mention_details (mention_id, {', '.join(columns)})
+            VALUES (?, {', '.join('?' for _ in columns)})
+        """, values)
+
+async def insert_mentions(platform: Platform, mentions: List[Dict]) -> List[Dict]:
+    """Вставляет пачку упоминаний одной платформы в одной транзакции.
+
+    Упоминания с уже сохранёнными ссылками пропускаются. Поля платформы
+    пишутся в её таблицу расширения. Возвращает действительно вставленные
+    строки (с id) для рассылки подписчикам.
     """
-    
+    # Группируем упоминания по набору полей, чтобы каждой группе хватило одного executemany
+    groups: Dict[tuple, List[tuple]] = {}
+    for mention_data in mentions:
+        fields, details = split_details(platform, mention_data)
+        groups.setdefault(tuple(fields), []).append((tuple(fields.values()), fields.get("mention_link"), details))
+
+    inserted = 0
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            await db.execute(query, values)
-            await db.commit()
-            logger.info(f"Упоминание сохранено в таблицу {table_name}")
+        async with writer_connection() as db:
+            # Писатель один, поэтому все строки с id больше текущего максимума - наши
+            cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM mentions")
+            (last_id,) = await cursor.fetchone()
+            executed = []
+            for fields, rows in groups.items():
+                query = f"""
+                INSERT OR IGNORE INTO mentions (platform, {', '.join(fields)})
+                VALUES (?, {', '.join('?' for _ in fields)})
+                """
+                cursor = await db.executemany(query, [(platform.value, *values) for values, _, _ in rows])
+                inserted += cursor.rowcount
+                executed.extend(rows)
+            new_rows = []
+            if inserted:
+                cursor = await db.execute(
+                    f"SELECT {', '.join(MENTION_COLUMNS)} FROM mentions WHERE id > ? ORDER BY id",
+                    (last_id,)
+                )
+                new_rows = [row_to_mention(row) for row in await cursor.fetchall()]
+
+                # Вставленная строка находится по ссылке (из повторов в пачке
+                # вставляется первый), а строки без ссылки не пропускаются и
+                # идут в порядке вставки
+                by_link: Dict[str, Dict] = {}
+                unlinked = []
+                for _, link, details in executed:
+                    if link is None:
+                        unlinked.append(details)
+                    else:
+                        by_link.setdefault(link, details)
+                unlinked_details = iter(unlinked)
+                await insert_mention_details(db, platform, [
+                    (mention["id"], by_link.get(mention["mention_link"], {}) if mention["mention_link"] is not None
+                     else next(unlinked_details))
+                    for mention in new_rows
+                ])
+        logger.info(f"Сохранено упоминаний {platform.value}: {inserted} из {len(mentions)}")
+        return new_rows
     except Exception as e:
-        logger.error(f"Ошибка при сохранении упоминания в {table_name}: {e}")
+        logger.error(f"Ошибка при пакетном сохранении упоминаний {platform.value}: {e}")
         raise
 
+def row_to_mention(row) -> Dict:
+    """Превращает строку с полями MENTION_COLUMNS в словарь упоминания"""
+    mention = dict(zip(MENTION_COLUMNS, row))
+    if mention.get("matched_keywords"):
+        mention["matched_keywords"] = json.loads(mention["matched_keywords"])
+    return mention
+
+def mention_filters(
+    platform: Optional[Platform] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    source_id: Optional[str] = None
+) -> tuple:
+    """Условия WHERE и параметры для общих фильтров упоминаний"""
+    conditions = []
+    params = []
+    if platform:
+        conditions.append("platform = ?")
+        params.append(platform.value)
+    if start_date:
+        conditions.append("mention_ts >= ?")
+        params.append(to_timestamp(start_date))
+    if end_date:
+        conditions.append("mention_ts <= ?")
+        params.append(to_timestamp(end_date))
+    if source_id:
+        conditions.append("source_id = ?")
+        params.append(source_id)
+    return conditions, params
+
+def mention_order_key(mention: Dict) -> tuple:
+    """Позиция упоминания в порядке (mention_ts, id); без mention_ts - в самом начале"""
+    ts = mention["mention_ts"]
+    return (ts if ts is not None else -1, mention["id"])
+
+async def select_mentions(
+    where_clause: str,
+    params: list,
+    limit: int,
+    older: bool = True,
+    start_ts: Optional[int] = None,
+    end_ts: Optional[int] = None
+) -> List[Dict]:
+    """Первые limit упоминаний по условию в порядке (mention_ts, id) из горячей БД и архивов.
+
+    older=True - по убыванию, иначе по возрастанию. Горячая БД читается
+    всегда, из архивов - только месяцы, пересекающиеся с [start_ts, end_ts],
+    от ближайшего к началу порядка. Следующий месяц не открывается, если все
+    его упоминания заведомо дальше уже набранных limit строк.
+    """
+    order = "DESC" if older else "ASC"
+    query = f"""
+    SELECT {', '.join(MENTION_COLUMNS)}
+    FROM mentions
+    WHERE {where_clause}
+    ORDER BY mention_ts {order}, id {order}
+    LIMIT ?
+    """
+    async with reader_connection() as db:
+        rows = await (await db.execute(query, [*params, limit])).fetchall()
+    mentions = [row_to_mention(row) for row in rows]
+
+    months = mention_archive.covering(start_ts, end_ts)
+    for month in reversed(months) if older else months:
+        if len(mentions) >= limit:
+            first, last = month_bounds(month)
+            edge = mention_order_key(mentions[-1])[0]
+            if (last <= edge) if older else (first > edge):
+                break
+        async with mention_archive.open(month) as db:
+            rows = await (await db.execute(query, [*params, limit])).fetchall()
+        # Строка может быть и в архиве, и в горячей БД, если перенос месяца прервался
+        seen = {mention["id"] for mention in mentions}
+        mentions.extend(row_to_mention(row) for row in rows if row[0] not in seen)
+        mentions.sort(key=mention_order_key, reverse=older)
+        del mentions[limit:]
+    return mentions
+
 async def get_mentions(
     platform: Optional[Platform] = None,
     start_date: Optional[str] = None,
@@ -140,91 +952,163 @@ async def get_mentions(
     limit: int = 100,
     offset: int = 0
 ) -> List[Dict]:
-    """Полуает упоминания с возможностью фильтрации"""
-    # Формируем UNION запрос для всех таблиц упоминаний
-    union_queries = []
-    params = []
-    
-    # Если указана платформа, берем только её таблицу
-    platforms = [platform] if platform else list(Platform)
-    
-    for p in platforms:
-        conditions = []
-        
-        if start_date:
-            conditions.append("mention_datetime >= ?")
-            params.append(start_date)
-        if end_date:
-            conditions.append("mention_datetime <= ?")
-            params.append(end_date)
-        if source_id:
-            conditions.append("source_id = ?")
-            params.append(source_id)
-        
-        where_clause = " AND ".join(conditions) if conditions else "1=1"
-        
-        union_queries.append(f"""
-            SELECT 
-                id,
-                '{p.value}' as platform,
-                mention_datetime,
-                mention_link,
-                source_id,
-                source_link,
-                user_id,
-                user_name,
-                user_nick,
-                mention_text,
-                created_at
-            FROM {p.value}_mentions
-            WHERE {where_clause}
-        """)
-    
-    query = f"""
-    SELECT * FROM (
-        {" UNION ALL ".join(union_queries)}
-    )
-    ORDER BY mention_datetime DESC
-    LIMIT ? OFFSET ?
+    """Получает упоминания с возможностью фильтрации (по убыванию времени).
+
+    Архивные месяцы читаются, только если их покрывает период запроса.
     """
-    
-    params.extend([limit, offset])
-    
+    conditions, params = mention_filters(platform, start_date, end_date, source_id)
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            cursor = await db.execute(query, params)
-            rows = await cursor.fetchall()
-            
-            mentions = []
-            for row in rows:
-                mentions.append({
-                    "id": row[0],
-                    "platform": row[1],
-                    "mention_datetime": row[2],
-                    "mention_link": row[3],
-                    "source_id": row[4],
-                    "source_link": row[5],
-                    "user_id": row[6],
-                    "user_name": row[7],
-                    "user_nick": row[8],
-                    "mention_text": row[9],
-                    "created_at": row[10]
-                })
-            return mentions
+        mentions = await select_mentions(
+            where_clause, params, offset + limit,
+            start_ts=to_timestamp(start_date), end_ts=to_timestamp(end_date)
+        )
+        return mentions[offset:]
     except Exception as e:
         logger.error(f"Ошибка при получении упоминаний: {e}")
         raise
 
+async def iter_mentions(
+    platform: Optional[Platform] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    source_id: Optional[str] = None,
+    chunk_size: int = 1000
+):
+    """Перебирает все упоминания по фильтрам get_mentions пачками по chunk_size.
+
+    Читает курсором на отдельном соединении, поэтому память не зависит от
+    объёма выгрузки, а долгая выгрузка не занимает пул читателей. Упоминания
+    идут по времени: сначала архивные месяцы периода, затем горячая БД.
+    """
+    conditions, params = mention_filters(platform, start_date, end_date, source_id)
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+    query = f"""
+    SELECT {', '.join(MENTION_COLUMNS)}
+    FROM mentions
+    WHERE {where_clause}
+    ORDER BY mention_ts, id
+    """
+    for month in mention_archive.covering(to_timestamp(start_date), to_timestamp(end_date)):
+        async with mention_archive.open(month) as db:
+            async with db.execute(query, params) as cursor:
+                while rows := await cursor.fetchmany(chunk_size):
+                    yield [row_to_mention(row) for row in rows]
+    async with dedicated_reader_connection() as db:
+        async with db.execute(query, params) as cursor:
+            while rows := await cursor.fetchmany(chunk_size):
+                yield [row_to_mention(row) for row in rows]
+
+async def get_last_mention_id() -> int:
+    """Максимальный id упоминания"""
+    async with reader_connection() as db:
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM mentions")
+        (last_id,) = await cursor.fetchone()
+        return last_id
+
+async def get_mentions_after(
+    last_id: int,
+    platform: Optional[Platform] = None,
+    source_id: Optional[str] = None,
+    limit: int = 500
+) -> List[Dict]:
+    """Упоминания, вставленные после last_id, в порядке вставки.
+
+    Возвращает не больше limit строк; для дочитывания остатка вызывается
+    повторно с id последнего упоминания.
+    """
+    conditions, params = mention_filters(platform, source_id=source_id)
+    # Новые строки ищутся по диапазону id, а не по индексам фильтров
+    query = f"""
+    SELECT {', '.join(MENTION_COLUMNS)} FROM mentions NOT INDEXED
+    WHERE {' AND '.join(["id > ?", *conditions])}
+    ORDER BY id
+    LIMIT ?
+    """
+    async with reader_connection() as db:
+        cursor = await db.execute(query, [last_id, *params, limit])
+        return [row_to_mention(row) for row in await cursor.fetchall()]
+
+def encode_cursor(mention: Dict) -> str:
+    """Непрозрачный курсор страницы: позиция упоминания в общем порядке"""
+    raw = json.dumps([mention["mention_ts"], mention["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """Разбирает курсор; при ошибке бросает ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, mention_id = json.loads(raw)
+        return int(ts), int(mention_id)
+    except Exception as e:
+        raise ValueError(f"Некорректный курсор: {cursor}") from e
+
+async def get_mentions_page(
+    platform: Optional[Platform] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    source_id: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    backward: bool = False
+) -> Dict:
+    """Получает страницу упоминаний по курсору (keyset-пагинация).
+
+    Без курсора возвращается первая (самая свежая) страница. С курсором -
+    следующая страница после него или, при backward=True, предыдущая.
+    Порядок - (mention_ts, id) по убыванию, и каждая страница - ограниченный
+    поиск по индексу, поэтому её стоимость не зависит от глубины. Упоминания
+    без mention_ts в постраничный вывод не попадают.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    older = not backward
+
+    conditions, params = mention_filters(platform, start_date, end_date, source_id)
+    conditions.insert(0, "mention_ts IS NOT NULL")
+    if position:
+        conditions.append(f"(mention_ts, id) {'<' if older else '>'} (?, ?)")
+        params.extend(position)
+
+    # Архивные месяцы ограничены и периодом, и позицией курсора
+    start_ts, end_ts = to_timestamp(start_date), to_timestamp(end_date)
+    if position and older:
+        end_ts = position[0] if end_ts is None else min(end_ts, position[0])
+    elif position:
+        start_ts = position[0] if start_ts is None else max(start_ts, position[0])
+    try:
+        mentions = await select_mentions(" AND ".join(conditions), params, limit + 1, older, start_ts, end_ts)
+    except Exception as e:
+        logger.error(f"Ошибка при получении страницы упоминаний: {e}")
+        raise
+
+    has_more = len(mentions) > limit
+    mentions = mentions[:limit]
+
+    if older:
+        next_cursor = encode_cursor(mentions[-1]) if has_more else None
+        prev_cursor = encode_cursor(mentions[0]) if position and mentions else None
+    else:
+        mentions.reverse()
+        prev_cursor = encode_cursor(mentions[0]) if has_more else None
+        next_cursor = encode_cursor(mentions[-1]) if mentions else None
+
+    return {"mentions": mentions, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
 async def add_source(platform: Platform, source_id: str, source_name: str, source_link: str):
-    """Добавляет новый источник"""
+    """Добавляет новый источник или обновляет название и ссылку существующего"""
+    # Неизменившийся источник не перезаписывается: RSSEye вызывает add_source
+    # при каждой проверке ленты, и лишняя запись сбрасывала бы кэш справочников
     query = """
-    INSERT OR REPLACE INTO sources (platform, source_id, source_name, source_link)
+    INSERT INTO sources (platform, source_id, source_name, source_link)
     VALUES (?, ?, ?, ?)
+    ON CONFLICT (platform, source_id) DO UPDATE SET
+        source_name = excluded.source_name,
+        source_link = excluded.source_link
+    WHERE source_name IS NOT excluded.source_name OR source_link IS NOT excluded.source_link
     """
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with writer_connection() as db:
             await db.execute(query, (platform.value, source_id, source_name, source_link))
-            await db.commit()
         logger.info(f"Источник {source_name} добавлен/обновлен")
     except Exception as e:
         logger.error(f"Ошибка при добавлении источника: {e}")
@@ -237,9 +1121,8 @@ async def add_keyword(keyword: str):
     VALUES (?)
     """
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with writer_connection() as db:
             await db.execute(query, (keyword,))
-            await db.commit()
         logger.info(f"Ключевое слово {keyword} добавлено")
     except Exception as e:
         logger.error(f"Ошибка при добавлении ключевого слова: {e}")
@@ -255,7 +1138,7 @@ async def get_active_sources(platform: Optional[Platform] = None) -> List[Dict]:
         params.append(platform.value)
     
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with reader_connection() as db:
             cursor = await db.execute(query, params)
             rows = await cursor.fetchall()
             
@@ -280,10 +1163,440 @@ async def get_active_keywords() -> List[str]:
     """Получает список активных ключевых слов"""
     query = "SELECT keyword FROM keywords WHERE is_active = 1"
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with reader_connection() as db:
             cursor = await db.execute(query)
             rows = await cursor.fetchall()
             return [row[0] for row in rows]
     except Exception as e:
         logger.error(f"Ошибка при получении списка ключевых слов: {e}")
-        raise
\ No newline at end of file
+        raise
+
+async def get_keywords_version() -> tuple:
+    """Возвращает отпечаток таблицы keywords, меняющийся при любом её изменении"""
+    query = """
+    SELECT COUNT(*), COALESCE(SUM(is_active), 0), COALESCE(MAX(id), 0), COALESCE(MAX(updated_at), '')
+    FROM keywords
+    """
+    async with reader_connection() as db:
+        cursor = await db.execute(query)
+        return tuple(await cursor.fetchone())
+
+async def get_data_versions() -> Dict[str, int]:
+    """Возвращает счётчики изменений упоминаний, источников и ключевых слов"""
+    async with reader_connection() as db:
+        cursor = await db.execute("SELECT name, version FROM data_versions")
+        return {name: version for name, version in await cursor.fetchall()}
+
+async def mention_exists(platform: Platform, link: str) -> bool:
+    """Проверяет, сохранено ли уже упоминание с такой ссылкой"""
+    query = "SELECT 1 FROM mentions WHERE platform = ? AND mention_link = ? LIMIT 1"
+    async with reader_connection() as db:
+        cursor = await db.execute(query, (platform.value, link))
+        result = await cursor.fetchone()
+        return result is not None
+
+async def get_existing_links(platform: Platform, links: List[str]) -> set:
+    """Возвращает те ссылки из списка, которые уже сохранены (пакетная проверка)"""
+    existing = set()
+    async with reader_connection() as db:
+        for i in range(0, len(links), IN_QUERY_CHUNK_SIZE):
+            chunk = links[i:i + IN_QUERY_CHUNK_SIZE]
+            query = f"""
+            SELECT mention_link FROM mentions
+            WHERE platform = ? AND mention_link IN ({', '.join('?' for _ in chunk)})
+            """
+            cursor = await db.execute(query, [platform.value, *chunk])
+            existing.update(row[0] for row in await cursor.fetchall())
+    return existing
+
+async def iter_recent_links(platform: Platform, days: int):
+    """Перебирает ссылки упоминаний, сохранённых за последние days дней"""
+    query = """
+    SELECT mention_link FROM mentions
+    WHERE platform = ? AND mention_link IS NOT NULL AND created_at >= datetime('now', ?)
+    """
+    async with reader_connection() as db:
+        async with db.execute(query, (platform.value, f"-{days} days")) as cursor:
+            async for row in cursor:
+                yield row[0]
+
+async def iter_recent_fingerprints(since_ts: int):
+    """Перебирает (simhash, cluster_id, mention_ts) упоминаний всех платформ начиная с since_ts"""
+    query = """
+    SELECT simhash, cluster_id, mention_ts FROM mentions
+    WHERE mention_ts >= ? AND simhash IS NOT NULL
+    """
+    async with reader_connection() as db:
+        async with db.execute(query, (since_ts,)) as cursor:
+            async for row in cursor:
+                yield row
+
+async def get_feed_states() -> Dict[str, Dict]:
+    """Получает сохранённые валидаторы всех RSS-лент"""
+    query = "SELECT feed_url, etag, last_modified, content_hash FROM feed_state"
+    try:
+        async with reader_connection() as db:
+            cursor = await db.execute(query)
+            rows = await cursor.fetchall()
+            return {
+                row[0]: {"etag": row[1], "last_modified": row[2], "content_hash": row[3]}
+                for row in rows
+            }
+    except Exception as e:
+        logger.error(f"Ошибка при получении состояния лент: {e}")
+        raise
+
+async def save_feed_state(feed_url: str, etag: Optional[str], last_modified: Optional[str], content_hash: Optional[str]):
+    """Сохраняет валидаторы RSS-ленты после её успешной обработки"""
+    query = """
+    INSERT INTO feed_state (feed_url, etag, last_modified, content_hash, updated_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(feed_url) DO UPDATE SET
+        etag = excluded.etag,
+        last_modified = excluded.last_modified,
+        content_hash = excluded.content_hash,
+        updated_at = excluded.updated_at
+    """
+    try:
+        async with writer_connection() as db:
+            await db.execute(query, (feed_url, etag, last_modified, content_hash))
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении состояния ленты {feed_url}: {e}")
+        raise
+
+async def add_notifications(channel: str, notifications: List[tuple]) -> List[int]:
+    """Сохраняет уведомления (chat_id, text, summary) в очередь и возвращает их id"""
+    try:
+        async with writer_connection() as db:
+            cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM notification_outbox")
+            (last_id,) = await cursor.fetchone()
+            await db.executemany(
+                "INSERT INTO notification_outbox (channel, chat_id, text, summary) VALUES (?, ?, ?, ?)",
+                [(channel, *notification) for notification in notifications]
+            )
+            cursor = await db.execute("SELECT id FROM notification_outbox WHERE id > ? ORDER BY id", (last_id,))
+            return [row[0] for row in await cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении уведомлений {channel}: {e}")
+        raise
+
+async def get_pending_notifications(channel: str) -> List[Dict]:
+    """Возвращает недоставленные уведомления отправителя в порядке поступления"""
+    query = """
+    SELECT id, chat_id, text, summary, attempts FROM notification_outbox
+    WHERE channel = ? ORDER BY id
+    """
+    async with reader_connection() as db:
+        cursor = await db.execute(query, (channel,))
+        return [
+            {"id": row[0], "chat_id": row[1], "text": row[2], "summary": row[3], "attempts": row[4]}
+            for row in await cursor.fetchall()
+        ]
+
+async def delete_notifications(ids: List[int]):
+    """Удаляет доставленные (или отброшенные) уведомления из очереди"""
+    async with writer_connection() as db:
+        for i in range(0, len(ids), IN_QUERY_CHUNK_SIZE):
+            chunk = ids[i:i + IN_QUERY_CHUNK_SIZE]
+            await db.execute(
+                f"DELETE FROM notification_outbox WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+            )
+
+async def increment_notification_attempts(ids: List[int]):
+    """Увеличивает счётчик неудачных попыток доставки"""
+    async with writer_connection() as db:
+        for i in range(0, len(ids), IN_QUERY_CHUNK_SIZE):
+            chunk = ids[i:i + IN_QUERY_CHUNK_SIZE]
+            await db.execute(
+                f"UPDATE notification_outbox SET attempts = attempts + 1 WHERE id IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            )
+
+async def get_backfill_state(chat_id: int) -> Optional[Dict]:
+    """Возвращает прогресс загрузки истории чата или None"""
+    query = """
+    SELECT min_message_id, max_message_id, complete FROM telegram_backfill_state WHERE chat_id = ?
+    """
+    async with reader_connection() as db:
+        cursor = await db.execute(query, (chat_id,))
+        row = await cursor.fetchone()
+    if row is None:
+        return None
+    return {"min_message_id": row[0], "max_message_id": row[1], "complete": bool(row[2])}
+
+async def save_backfill_state(chat_id: int, min_message_id: int, max_message_id: int, complete: bool = False):
+    """Сохраняет прогресс загрузки истории чата"""
+    query = """
+    INSERT INTO telegram_backfill_state (chat_id, min_message_id, max_message_id, complete, updated_at)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(chat_id) DO UPDATE SET
+        min_message_id = excluded.min_message_id,
+        max_message_id = excluded.max_message_id,
+        complete = excluded.complete,
+        updated_at = excluded.updated_at
+    """
+    try:
+        async with writer_connection() as db:
+            await db.execute(query, (chat_id, min_message_id, max_message_id, complete))
+    except Exception as e:
+        logger.error(f"Ошибка при сохранении прогресса загрузки истории чата {chat_id}: {e}")
+        raise
+
+async def rebuild_search_index() -> int:
+    """Заново заполняет mentions_fts из таблицы упоминаний"""
+    async with writer_connection() as db:
+        total = await fill_search_index(db)
+    logger.info(f"Полнотекстовый индекс перестроен: {total} упоминаний")
+    return total
+
+async def search_mentions(query: str, platform: Optional[Platform] = None, limit: int = 50) -> List[Dict]:
+    """Полнотекстовый поиск упоминаний (синтаксис запросов FTS5), по убыванию релевантности.
+
+    Ищет только в горячей БД: архивные месяцы в индекс не входят. snippet и
+    highlight - исходный текст упоминания, экранированный для HTML, с <mark>
+    вокруг совпадений (см. mark_matches).
+    """
+    conditions = ["mentions_fts MATCH ?"]
+    params: List[Union[str, int]] = [fts_normalize(query)]
+    if platform:
+        conditions.append("mentions.platform = ?")
+        params.append(platform.value)
+    fts_query = f"""
+    SELECT {', '.join(f'mentions.{column}' for column in MENTION_COLUMNS)},
+           bm25(mentions_fts),
+           snippet(mentions_fts, 0, '{FTS_MARK_OPEN}', '{FTS_MARK_CLOSE}', '{FTS_ELLIPSIS}', 16),
+           highlight(mentions_fts, 0, '{FTS_MARK_OPEN}', '{FTS_MARK_CLOSE}')
+    FROM mentions_fts
+    JOIN mentions ON mentions.id = mentions_fts.rowid
+    WHERE {' AND '.join(conditions)}
+    ORDER BY rank
+    LIMIT ?
+    """
+    params.append(limit)
+
+    try:
+        async with reader_connection() as db:
+            cursor = await db.execute(fts_query, params)
+            hits = await cursor.fetchall()
+    except sqlite3.OperationalError as e:
+        # Ошибки синтаксиса запроса FTS5
+        raise ValueError(f"Некорректный поисковый запрос: {e}") from e
+    except Exception as e:
+        logger.error(f"Ошибка полнотекстового поиска: {e}")
+        raise
+
+    columns = len(MENTION_COLUMNS)
+    results = []
+    for row in hits:
+        rank, snippet, highlighted = row[columns:]
+        mention = row_to_mention(row[:columns])
+        results.append({
+            **mention,
+            "rank": rank,
+            "snippet": mark_matches(mention["mention_text"], snippet),
+            "highlight": mark_matches(mention["mention_text"], highlighted)
+        })
+    return results
+
+async def get_stats(
+    granularity: str = "day",
+    platform: Optional[Platform] = None,
+    source_id: Optional[str] = None,
+    keyword: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    group_by: Optional[str] = None
+) -> List[Dict]:
+    """Временной ряд числа упоминаний по таблицам агрегатов.
+
+    group_by ("platform", "source_id" или "keyword") разбивает ряд по
+    значениям этого поля. Ключевые слова сравниваются без учёта регистра.
+    Стоимость зависит от числа интервалов, а не от числа упоминаний.
+    """
+    table, size = ROLLUP_TABLES[granularity]
+    start_ts, end_ts = to_timestamp(start_date), to_timestamp(end_date)
+    if (start_date and start_ts is None) or (end_date and end_ts is None):
+        raise ValueError("Некорректная дата")
+    conditions = []
+    params: List[Union[str, int]] = []
+    if group_by == "keyword" and not keyword:
+        conditions.append("keyword != ''")
+    else:
+        conditions.append("keyword = ?")
+        params.append(keyword_key(keyword or ""))
+    if start_ts is not None:
+        conditions.append("bucket >= ?")
+        params.append(start_ts // size * size)
+    if end_ts is not None:
+        conditions.append("bucket <= ?")
+        params.append(end_ts)
+    if platform:
+        conditions.append("platform = ?")
+        params.append(platform.value)
+    if source_id:
+        conditions.append("source_id = ?")
+        params.append(source_id)
+
+    group_column = group_by if group_by in ("platform", "source_id", "keyword") else "''"
+    query = f"""
+    SELECT bucket, {group_column}, SUM(mentions)
+    FROM {table}
+    WHERE {' AND '.join(conditions)}
+    GROUP BY bucket, {group_column}
+    HAVING SUM(mentions) > 0
+    ORDER BY bucket
+    """
+    try:
+        async with reader_connection() as db:
+            cursor = await db.execute(query, params)
+            rows = await cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Ошибка при получении статистики: {e}")
+        raise
+
+    series = []
+    for bucket, group, mentions in rows:
+        point = {
+            "bucket": datetime.datetime.fromtimestamp(bucket, tz=datetime.timezone.utc).isoformat(),
+            "mentions": mentions
+        }
+        if group_by:
+            point[group_by] = group
+        series.append(point)
+    return series
+
+async def archive_month(month: str) -> int:
+    """Переносит упоминания месяца 'YYYY-MM' из горячей БД в его архив.
+
+    Строки дописываются к уже заархивированным и удаляются из mentions только
+    после того, как архив сжат и записан. Агрегаты не меняются: вклад
+    переносимых строк прибавляется перед удалением, и триггеры удаления его
+    вычитают. Полнотекстовый индекс архивных месяцев не покрывает.
+    """
+    first, last = month_bounds(month)
+    async with reader_connection() as db:
+        (max_id,) = await (await db.execute("SELECT COALESCE(MAX(id), 0) FROM mentions")).fetchone()
+    # Упоминания, вставленные во время переноса, ждут следующего запуска
+    where = "mentions.mention_ts >= ? AND mentions.mention_ts < ? AND mentions.id <= ?"
+    params = [first, last, max_id]
+
+    tables = [("mentions", "mentions", MENTION_COLUMNS)] + [
+        (f"{p.value}_mention_details", f"{p.value}_mention_details JOIN mentions ON mentions.id = mention_id", ("mention_id", *columns))
+        for p, columns in MENTION_DETAILS.items()
+    ]
+    async with mention_archive.edit(month) as archive:
+        for query in ARCHIVE_SCHEMA_QUERIES:
+            await archive.execute(query)
+        async with dedicated_reader_connection() as db:
+            for table, source, columns in tables:
+                select_columns = ", ".join(f"{table}.{column}" for column in columns)
+                async with db.execute(f"SELECT {select_columns} FROM {source} WHERE {where}", params) as cursor:
+                    while rows := await cursor.fetchmany(ARCHIVE_BATCH_SIZE):
+                        await archive.executemany(
+                            f"INSERT OR IGNORE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                            rows
+                        )
+
+    async with writer_connection() as db:
+        for table, size in ROLLUP_TABLES.values():
+            rows = await (await db.execute(rollup_counts_sql(size, where), params * 2)).fetchall()
+            await add_rollup_counts(db, table, rows)
+        cursor = await db.execute(f"DELETE FROM mentions WHERE {where}", params)
+    logger.info(f"Упоминания за {month} перенесены в архив: {cursor.rowcount}")
+    return cursor.rowcount
+
+async def archive_old_mentions(hot_months: int = HOT_MONTHS) -> Dict[str, int]:
+    """Переносит в архив все месяцы старше hot_months последних (считая текущий)"""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    index = now.year * 12 + now.month - hot_months
+    boundary, _ = month_bounds(f"{index // 12:04d}-{index % 12 + 1:02d}")
+    async with reader_connection() as db:
+        cursor = await db.execute("""
+            SELECT DISTINCT strftime('%Y-%m', mention_ts, 'unixepoch')
+            FROM mentions
+            WHERE mention_ts < ?
+        """, (boundary,))
+        months = sorted(row[0] for row in await cursor.fetchall())
+    return {month: await archive_month(month) for month in months}
+
+# Условие purge_archive_month; параметры - (platform, cutoff)
+ARCHIVE_PURGE_WHERE = "mentions.platform = ? AND mentions.mention_ts < ?"
+
+async def delete_archive_rows(archive: aiosqlite.Connection, platform: Platform, cutoff: int) -> int:
+    """Удаляет из правки архива упоминания платформы старше cutoff; возвращает число оставшихся"""
+    params = [platform.value, cutoff]
+    await archive.execute(
+        f"DELETE FROM {platform.value}_mention_details WHERE mention_id IN (SELECT id FROM mentions WHERE {ARCHIVE_PURGE_WHERE})",
+        params
+    )
+    await archive.execute(f"DELETE FROM mentions WHERE {ARCHIVE_PURGE_WHERE}", params)
+    (remaining,) = await (await archive.execute("SELECT COUNT(*) FROM mentions")).fetchone()
+    return remaining
+
+async def purge_archive_month(month: str, platform: Platform, cutoff: int) -> int:
+    """Удаляет из архива месяца упоминания платформы старше cutoff.
+
+    Вклад удаляемых строк вычитается из агрегатов вместе с отметкой в
+    archive_purges до того, как правка архива записана. Если она не
+    записалась (ошибка или остановка процесса), finish_archive_purges
+    доводит удаление до конца, не трогая агрегаты повторно.
+    """
+    params = [platform.value, cutoff]
+    async with mention_archive.open(month) as archive:
+        (expired,) = await (await archive.execute(f"SELECT COUNT(*) FROM mentions WHERE {ARCHIVE_PURGE_WHERE}", params)).fetchone()
+    if not expired:
+        return 0
+
+    async with mention_archive.edit(month) as archive:
+        counts = {
+            table: await archive_rollup_counts(archive, size, ARCHIVE_PURGE_WHERE, params)
+            for table, size in ROLLUP_TABLES.values()
+        }
+        remaining = await delete_archive_rows(archive, platform, cutoff)
+        # Удалённые из архива упоминания больше не учитываются в статистике
+        async with writer_connection() as db:
+            for table, rows in counts.items():
+                await add_rollup_counts(db, table, rows, sign=-1)
+            await db.execute(
+                "INSERT OR REPLACE INTO archive_purges (month, platform, cutoff) VALUES (?, ?, ?)",
+                (month, platform.value, cutoff)
+            )
+    if not remaining:
+        mention_archive.remove(month)
+    async with writer_connection() as db:
+        await db.execute("DELETE FROM archive_purges WHERE month = ? AND platform = ?", (month, platform.value))
+    return expired
+
+async def finish_archive_purges() -> int:
+    """Доводит до конца удаления из архивов, прерванные после вычитания агрегатов"""
+    async with reader_connection() as db:
+        pending = await (await db.execute("SELECT month, platform, cutoff FROM archive_purges")).fetchall()
+    for month, platform, cutoff in pending:
+        if mention_archive.path(month):
+            async with mention_archive.edit(month) as archive:
+                remaining = await delete_archive_rows(archive, Platform(platform), cutoff)
+            if not remaining:
+                mention_archive.remove(month)
+        async with writer_connection() as db:
+            await db.execute("DELETE FROM archive_purges WHERE month = ? AND platform = ?", (month, platform))
+        logger.info(f"Завершено прерванное удаление {platform} из архива за {month}")
+    return len(pending)
+
+async def apply_retention(retention_days: Dict[Platform, int]) -> Dict[Platform, int]:
+    """Удаляет упоминания старше срока хранения платформы из горячей БД и архивов"""
+    # Прерванные удаления завершаются первыми, чтобы их строки не вычлись из агрегатов дважды
+    await finish_archive_purges()
+    now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+    removed = {}
+    for platform, days in retention_days.items():
+        cutoff = now - days * 86400
+        async with writer_connection() as db:
+            cursor = await db.execute(
+                "DELETE FROM mentions WHERE platform = ? AND mention_ts < ?",
+                (platform.value, cutoff)
+            )
+            removed[platform] = cursor.rowcount
+        for month in mention_archive.covering(end_ts=cutoff - 1):
+            removed[platform] += await purge_archive_month(month, platform, cutoff)
+        logger.info(f"Удалено упоминаний {platform.value} старше {days} дн.: {removed[platform]}")
+    return removed
@@ -0,0 +1,212 @@
+# backend/db/manage.py
+#
+# Служебные команды общей БД.
+# Запуск: python -m app.backend.db.manage <команда>
+
+import argparse
+import asyncio
+import datetime
+import sys
+from typing import Dict, Optional
+
+import aiosqlite
+
+from app.backend.db.database import (
+    HOT_MONTHS, Platform, init_db, close_db, insert_mentions, rebuild_rollups, rebuild_search_index,
+    apply_retention, archive_old_mentions, vacuum_db
+)
+from app.backend.export import COMPRESSIONS, FORMATS, export_mentions
+from app.backend.keywords import KeywordRegistry
+
+IMPORT_BATCH_SIZE = 1000
+
+
+async def rebuild_search(args: argparse.Namespace):
+    await rebuild_search_index()
+
+
+async def rebuild_stats(args: argparse.Namespace):
+    await rebuild_rollups()
+
+
+async def export(args: argparse.Namespace):
+    output = open(args.output, "wb") if args.output != "-" else sys.stdout.buffer
+    try:
+        async for chunk in export_mentions(
+            args.format,
+            args.compression,
+            platform=Platform(args.platform) if args.platform else None,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            source_id=args.source_id
+        ):
+            output.write(chunk)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+
+def retention_rule(value: str) -> tuple:
+    """PLATFORM=DAYS, например vk=180"""
+    platform, _, days = value.partition("=")
+    try:
+        return Platform(platform), int(days)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Ожидается PLATFORM=DAYS, получено: {value}")
+
+
+async def compact(args: argparse.Namespace):
+    if args.retention:
+        await apply_retention(dict(args.retention))
+    archived = await archive_old_mentions(args.hot_months)
+    for month, moved in archived.items():
+        print(f"{month}: перенесено в архив {moved}")
+    if not args.no_vacuum:
+        await vacuum_db()
+
+
+def legacy_datetime(value) -> Optional[str]:
+    """Дата из старой БД в ISO 8601 (sqlite3 сохранял datetime через пробел)"""
+    try:
+        return datetime.datetime.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        return value
+
+
+def legacy_vk_mention(row: Dict) -> Dict:
+    """Строка vk_mentions из vk_eye.db"""
+    link = row["mention_link"] or ""
+    return {
+        **row,
+        "mention_datetime": legacy_datetime(row["mention_datetime"]),
+        # https://vk.com/wall{source_id}_{post_id}
+        "post_id": link.rsplit("_", 1)[-1] if "/wall" in link else None
+    }
+
+
+def legacy_telegram_mention(row: Dict) -> Dict:
+    """Строка tg_mentions из telegram_eye_msgs.db"""
+    # Старый save_message_to_db передавал значения со сдвигом относительно
+    # колонок: ссылка на сообщение оказывалась в user_nick и т.д.
+    if not str(row["message_link"]).startswith("http") and str(row["user_nick"]).startswith("http"):
+        row = {
+            **row,
+            "chat_id": row["message_link"],
+            "chat_link": row["chat_id"],
+            "user_id": row["chat_link"],
+            "user_name": row["user_id"],
+            "user_nick": row["user_name"],
+            "message_link": row["user_nick"]
+        }
+    return {
+        "mention_datetime": legacy_datetime(row["message_datetime"]),
+        "mention_link": row["message_link"],
+        "source_id": str(row["chat_id"]),
+        "source_link": row["chat_link"],
+        "user_id": str(row["user_id"]),
+        "user_name": row["user_name"],
+        "user_nick": row["user_nick"],
+        "mention_text": row["message_text"],
+        "chat_id": str(row["chat_id"]),
+        "message_id": str(row["message_link"]).rsplit("/", 1)[-1]
+    }
+
+
+# Собственные БД «глаз» до перехода на общую БД: платформа -> (таблица, преобразование строки)
+LEGACY_EYE_TABLES = {
+    Platform.VK: ("vk_mentions", legacy_vk_mention),
+    Platform.TELEGRAM: ("tg_mentions", legacy_telegram_mention),
+}
+
+
+async def import_legacy_db(platform: Platform, path: str, keywords: KeywordRegistry) -> int:
+    """Переносит упоминания из старой БД «глаза» в общую таблицу пачками"""
+    table, convert = LEGACY_EYE_TABLES[platform]
+    imported = 0
+    async with aiosqlite.connect(f"file:{path}?mode=ro", uri=True) as legacy:
+        legacy.row_factory = aiosqlite.Row
+        async with legacy.execute(f"SELECT * FROM {table} ORDER BY id") as cursor:
+            while rows := await cursor.fetchmany(IMPORT_BATCH_SIZE):
+                batch = []
+                for row in rows:
+                    mention = convert(dict(row))
+                    # Найденные слова нужны агрегатам по ключевым словам
+                    mention["matched_keywords"] = keywords.matcher.find(mention["mention_text"] or "")
+                    batch.append(mention)
+                imported += len(await insert_mentions(platform, batch))
+    print(f"{path}: перенесено упоминаний {platform.value}: {imported}")
+    return imported
+
+
+async def import_legacy(args: argparse.Namespace):
+    keywords = KeywordRegistry(whole_words=False)
+    await keywords.refresh()
+    if args.vk:
+        await import_legacy_db(Platform.VK, args.vk, keywords)
+    if args.telegram:
+        await import_legacy_db(Platform.TELEGRAM, args.telegram, keywords)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Служебные команды общей БД ИСМУ")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_search_parser = subparsers.add_parser(
+        "rebuild-search",
+        help="Заново заполнить полнотекстовый индекс из таблицы упоминаний"
+    )
+    rebuild_search_parser.set_defaults(handler=rebuild_search)
+
+    rebuild_rollups_parser = subparsers.add_parser(
+        "rebuild-rollups",
+        help="Пересчитать почасовые и посуточные агрегаты упоминаний"
+    )
+    rebuild_rollups_parser.set_defaults(handler=rebuild_stats)
+
+    export_parser = subparsers.add_parser(
+        "export",
+        help="Выгрузить упоминания в NDJSON или CSV"
+    )
+    export_parser.add_argument("--format", choices=list(FORMATS), default="ndjson")
+    export_parser.add_argument("--compression", choices=list(COMPRESSIONS), default="none")
+    export_parser.add_argument("--platform", choices=[p.value for p in Platform])
+    export_parser.add_argument("--start-date", help="Начало периода (ISO 8601)")
+    export_parser.add_argument("--end-date", help="Конец периода (ISO 8601)")
+    export_parser.add_argument("--source-id")
+    export_parser.add_argument("-o", "--output", default="-", help="Файл выгрузки; по умолчанию stdout")
+    export_parser.set_defaults(handler=export)
+
+    import_parser = subparsers.add_parser(
+        "import-legacy",
+        help="Перенести упоминания из собственных БД VK Eye и Telegram Eye"
+    )
+    import_parser.add_argument("--vk", metavar="PATH", help="Путь к vk_eye.db")
+    import_parser.add_argument("--telegram", metavar="PATH", help="Путь к telegram_eye_msgs.db")
+    import_parser.set_defaults(handler=import_legacy)
+
+    compact_parser = subparsers.add_parser(
+        "compact",
+        help="Удалить упоминания старше срока хранения, перенести старые месяцы в архив и уплотнить БД"
+    )
+    compact_parser.add_argument(
+        "--hot-months", type=int, default=HOT_MONTHS,
+        help=f"Сколько последних месяцев оставить в горячей БД (по умолчанию {HOT_MONTHS})"
+    )
+    compact_parser.add_argument(
+        "--retention", type=retention_rule, action="append", default=[], metavar="PLATFORM=DAYS",
+        help="Срок хранения упоминаний платформы в днях; можно указать для нескольких платформ"
+    )
+    compact_parser.add_argument("--no-vacuum", action="store_true", help="Не выполнять VACUUM")
+    compact_parser.set_defaults(handler=compact)
+
+    args = parser.parse_args()
+
+    await init_db()
+    try:
+        await args.handler(args)
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
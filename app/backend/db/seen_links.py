@@ -0,0 +1,83 @@
+# backend/db/seen_links.py
+
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.backend.db.database import Platform, get_existing_links, iter_recent_links
+
+logger = logging.getLogger("joint_db")
+
+
+def link_digest(link: str) -> int:
+    """Компактный 64-битный отпечаток ссылки"""
+    return int.from_bytes(hashlib.blake2b(link.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class SeenLinkIndex:
+    """Индекс уже сохранённых ссылок, чтобы не спрашивать БД о каждой статье.
+
+    В памяти хранятся 64-битные отпечатки ссылок за последние horizon_days
+    дней. Совпадение отпечатка считается повтором; ссылки, которых нет в
+    памяти, проверяются в БД одним запросом на всю ленту — так находятся
+    записи старше горизонта.
+
+    Отдельно хранятся отпечатки ссылок, которые уже проверены и отклонены
+    (reject): статьи без ключевых слов остаются в ленте на много проверок,
+    но в БД за ними больше не ходят. Этот набор ограничен max_rejected
+    последними ссылками и сбрасывается при смене ключевых слов.
+    """
+
+    def __init__(self, horizon_days: int = 30, max_rejected: int = 500_000):
+        self.horizon_days = horizon_days
+        self.max_rejected = max_rejected
+        self._digests: Dict[Platform, Set[int]] = {p: set() for p in Platform}
+        # dict как упорядоченное множество: вытесняются самые старые отпечатки
+        self._rejected: Dict[Platform, Dict[int, None]] = {p: {} for p in Platform}
+
+    async def warm(self, platforms: Optional[Iterable[Platform]] = None):
+        """Заполняет индекс ссылками из БД за горизонт"""
+        for platform in platforms or Platform:
+            digests = self._digests[platform]
+            async for link in iter_recent_links(platform, self.horizon_days):
+                digests.add(link_digest(link))
+            logger.info(f"Индекс ссылок {platform.value}: загружено {len(digests)}")
+
+    def add(self, platform: Platform, link: str):
+        digest = link_digest(link)
+        self._digests[platform].add(digest)
+        self._rejected[platform].pop(digest, None)
+
+    def reject(self, platform: Platform, link: str):
+        """Запоминает проверенную, но не сохранённую ссылку"""
+        rejected = self._rejected[platform]
+        rejected[link_digest(link)] = None
+        if len(rejected) > self.max_rejected:
+            del rejected[next(iter(rejected))]
+
+    def clear_rejected(self):
+        """Забывает отклонённые ссылки, чтобы проверить их заново (например, по новым ключевым словам)"""
+        for rejected in self._rejected.values():
+            rejected.clear()
+
+    def __contains__(self, item: tuple) -> bool:
+        platform, link = item
+        return link_digest(link) in self._digests[platform]
+
+    async def filter_new(self, platform: Platform, links: Iterable[str]) -> List[str]:
+        """Возвращает ещё не сохранённые и не отклонённые ссылки (без повторов, в исходном порядке)"""
+        digests = self._digests[platform]
+        rejected = self._rejected[platform]
+        candidates: Dict[str, None] = {}
+        for link in links:
+            if link:
+                digest = link_digest(link)
+                if digest not in digests and digest not in rejected:
+                    candidates.setdefault(link, None)
+        if not candidates:
+            return []
+
+        existing = await get_existing_links(platform, list(candidates))
+        for link in existing:
+            digests.add(link_digest(link))
+        return [link for link in candidates if link not in existing]
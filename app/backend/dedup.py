@@ -0,0 +1,198 @@
+# backend/dedup.py
+
+import asyncio
+import hashlib
+import heapq
+import logging
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.backend.db.database import get_last_mention_id, get_mentions_after, iter_recent_fingerprints, to_timestamp
+
+# Настройка логирования
+logger = logging.getLogger("dedup")
+logger.setLevel(logging.INFO)
+
+if not logger.hasHandlers():
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+SIMHASH_BITS = 64
+BANDS = 8  # Отпечаток делится на 8 полос по 8 бит
+BAND_BITS = SIMHASH_BITS // BANDS
+MIN_TOKENS = 8  # Слишком короткие тексты не кластеризуются
+
+_URL_RE = re.compile(r"https?://\S+")
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    text = _URL_RE.sub(" ", text.lower().replace("ё", "е"))
+    return _TOKEN_RE.findall(text)
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-битный SimHash по множеству слов текста; None для коротких текстов.
+
+    Упоминания короткие, и шинглы из нескольких слов слишком чувствительны
+    к правкам: замена одного слова меняет сразу несколько шинглов.
+    """
+    tokens = tokenize(text)
+    if len(tokens) < MIN_TOKENS:
+        return None
+    words = set(tokens)
+    counts = [0] * SIMHASH_BITS
+    for word in words:
+        h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(SIMHASH_BITS):
+            counts[bit] += (h >> bit) & 1
+    half = len(words) / 2
+    return sum(1 << bit for bit, count in enumerate(counts) if count > half)
+
+
+def to_signed(value: int) -> int:
+    """SQLite хранит INTEGER со знаком"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << 64) - 1)
+
+
+class SimHashIndex:
+    """LSH-индекс отпечатков за скользящее окно времени.
+
+    Отпечаток раскладывается по BANDS корзинам - по одной на каждую
+    8-битную полосу. Отпечатки, отличающиеся не больше чем в
+    max_distance < BANDS битах, совпадают хотя бы в одной полосе, поэтому
+    кандидатов достаточно искать в корзинах нового отпечатка.
+    """
+
+    def __init__(self, window: float, max_distance: int = 7):
+        if max_distance >= BANDS:
+            raise ValueError(f"max_distance должно быть меньше {BANDS}")
+        self.window = window
+        self.max_distance = max_distance
+        self._buckets: Dict[Tuple[int, int], Dict[int, Tuple[int, float]]] = {}
+        self._expiry: List[Tuple[float, int]] = []
+
+    @staticmethod
+    def _bands(fingerprint: int):
+        for band in range(BANDS):
+            yield band, (fingerprint >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1)
+
+    def find(self, fingerprint: int) -> Optional[int]:
+        """Кластер ближайшего отпечатка на расстоянии не больше max_distance"""
+        best: Optional[Tuple[int, int]] = None
+        for key in self._bands(fingerprint):
+            for candidate, (cluster_id, _) in self._buckets.get(key, {}).items():
+                distance = (candidate ^ fingerprint).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, cluster_id)
+        return best[1] if best else None
+
+    def add(self, fingerprint: int, cluster_id: int, ts: float):
+        """Добавляет отпечаток; уже добавленный с тем же кластером и временем пропускается"""
+        first_band = next(self._bands(fingerprint))
+        if self._buckets.get(first_band, {}).get(fingerprint) == (cluster_id, ts):
+            return
+        for key in self._bands(fingerprint):
+            self._buckets.setdefault(key, {})[fingerprint] = (cluster_id, ts)
+        heapq.heappush(self._expiry, (ts, fingerprint))
+
+    def expire(self, now: float):
+        """Убирает отпечатки старше окна"""
+        while self._expiry and self._expiry[0][0] < now - self.window:
+            ts, fingerprint = heapq.heappop(self._expiry)
+            for key in self._bands(fingerprint):
+                bucket = self._buckets.get(key)
+                # Отпечаток мог быть добавлен повторно позже - тогда он ещё нужен
+                if bucket and bucket.get(fingerprint, (None, None))[1] == ts:
+                    del bucket[fingerprint]
+                    if not bucket:
+                        del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+
+class MentionDeduplicator:
+    """Кластеризация почти одинаковых упоминаний всех платформ.
+
+    Каждому упоминанию присваивается SimHash текста и cluster_id. Если в
+    индексе за последние window_hours есть близкий отпечаток, упоминание
+    попадает в его кластер и считается повтором (duplicate = 1): его
+    сохраняют, но не уведомляют о нём повторно. Иначе оно открывает новый
+    кластер, и cluster_id равен его собственному отпечатку. Индекс заполняется из БД
+    при первом sync и затем дочитывает упоминания, сохранённые другими
+    процессами, не чаще раза в sync_interval секунд. Время отпечатка везде -
+    mention_ts упоминания, поэтому упоминания, уже добавленные в индекс
+    в assign этого процесса, при sync не добавляются повторно.
+    """
+
+    def __init__(self, window_hours: float = 48, max_distance: int = 7, sync_interval: float = 5.0):
+        self.index = SimHashIndex(window_hours * 3600, max_distance)
+        self.sync_interval = sync_interval
+        self._last_id = 0
+        self._last_sync = 0.0
+        self._warmed = False
+        self._lock = asyncio.Lock()
+        self.duplicates = 0
+
+    async def warm(self):
+        """Загружает отпечатки упоминаний за окно из БД"""
+        self._last_id = await get_last_mention_id()
+        since = int(time.time() - self.index.window)
+        async for fingerprint, cluster_id, ts in iter_recent_fingerprints(since):
+            self.index.add(to_unsigned(fingerprint), to_unsigned(cluster_id), ts)
+        self._warmed = True
+        self._last_sync = time.monotonic()
+        logger.info(f"Индекс отпечатков загружен: {len(self.index)}")
+
+    async def sync(self, limit: int = 1000):
+        """Добавляет в индекс упоминания, сохранённые после последней синхронизации"""
+        async with self._lock:
+            if not self._warmed:
+                await self.warm()
+                return
+            if time.monotonic() - self._last_sync < self.sync_interval:
+                return
+            self._last_sync = time.monotonic()
+            while True:
+                mentions = await get_mentions_after(self._last_id, limit=limit)
+                for mention in mentions:
+                    self._last_id = mention["id"]
+                    # Свои упоминания уже в индексе с тем же временем - add их пропустит
+                    if mention["simhash"] is not None and mention["cluster_id"] is not None:
+                        self.index.add(
+                            to_unsigned(mention["simhash"]), to_unsigned(mention["cluster_id"]),
+                            mention["mention_ts"] or time.time()
+                        )
+                if len(mentions) < limit:
+                    break
+            self.index.expire(time.time())
+
+    def assign(self, mention_data: Dict) -> bool:
+        """Заполняет simhash и cluster_id упоминания; возвращает True для повтора"""
+        fingerprint = simhash(mention_data.get("mention_text") or "")
+        if fingerprint is None:
+            return False
+        cluster_id = self.index.find(fingerprint)
+        duplicate = cluster_id is not None
+        if not duplicate:
+            cluster_id = fingerprint
+        ts = mention_data.get("mention_ts") or to_timestamp(mention_data.get("mention_datetime")) or time.time()
+        self.index.add(fingerprint, cluster_id, ts)
+        mention_data["simhash"] = to_signed(fingerprint)
+        mention_data["cluster_id"] = to_signed(cluster_id)
+        mention_data["duplicate"] = int(duplicate)
+        if duplicate:
+            self.duplicates += 1
+        return duplicate
+
+
+def is_duplicate(mention: Dict) -> bool:
+    return bool(mention.get("duplicate"))
@@ -0,0 +1,103 @@
+# backend/export.py
+
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.backend.db.database import MENTION_COLUMNS, Platform, iter_mentions
+
+# zstd - необязательная зависимость
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_COLUMNS = MENTION_COLUMNS
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+COMPRESSIONS = {
+    "none": (None, ""),
+    "gzip": ("gzip", ".gz"),
+    "zstd": ("zstd", ".zst"),
+}
+
+
+def encode_ndjson(mentions: List[Dict]) -> str:
+    return "".join(json.dumps(mention, ensure_ascii=False) + "\n" for mention in mentions)
+
+
+def encode_csv(mentions: List[Dict], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for mention in mentions:
+        row = dict(mention)
+        if isinstance(row.get("matched_keywords"), list):
+            row["matched_keywords"] = ", ".join(row["matched_keywords"])
+        writer.writerow(row.get(column) for column in EXPORT_COLUMNS)
+    return buffer.getvalue()
+
+
+def make_compressor(compression: str):
+    """Потоковый компрессор с методами compress/flush или None"""
+    if compression == "gzip":
+        return zlib.compressobj(wbits=31)  # 31 - формат gzip
+    if compression == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ValueError("Сжатие zstd недоступно: не установлен пакет zstandard")
+        return zstandard.ZstdCompressor().compressobj()
+    if compression == "none":
+        return None
+    raise ValueError(f"Неизвестное сжатие: {compression}")
+
+
+def export_filename(export_format: str, compression: str) -> str:
+    return f"mentions.{FORMATS[export_format][1]}{COMPRESSIONS[compression][1]}"
+
+
+async def export_mentions(
+    export_format: str = "ndjson",
+    compression: str = "none",
+    platform: Optional[Platform] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    source_id: Optional[str] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Выгрузка упоминаний кусками байтов в NDJSON или CSV, при необходимости сжатая.
+
+    В памяти одновременно находится не больше одной пачки из chunk_size строк.
+    """
+    if export_format not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {export_format}")
+    compressor = make_compressor(compression)
+
+    first = True
+    async for mentions in iter_mentions(platform, start_date, end_date, source_id, chunk_size):
+        if export_format == "csv":
+            text = encode_csv(mentions, header=first)
+        else:
+            text = encode_ndjson(mentions)
+        first = False
+        data = text.encode("utf-8")
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+
+    # Пустая выгрузка в CSV - только заголовок
+    if first and export_format == "csv":
+        data = encode_csv([], header=True).encode("utf-8")
+        yield compressor.compress(data) if compressor is not None else data
+    if compressor is not None:
+        yield compressor.flush()
@@ -0,0 +1,147 @@
+# backend/ingestion.py
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.backend.db.database import Platform, insert_mentions
+from app.backend.dedup import MentionDeduplicator
+
+# Настройка логирования
+logger = logging.getLogger("ingestion")
+logger.setLevel(logging.INFO)
+
+if not logger.hasHandlers():
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+class IngestionQueue:
+    """Очередь отложенной записи упоминаний.
+
+    "Глаза" кладут упоминания в ограниченную очередь, а фоновая задача
+    сбрасывает их в БД пачками: по достижении batch_size или по истечении
+    flush_interval с момента получения первого упоминания пачки.
+    Каждая пачка пишется одной транзакцией на платформу.
+    Если задан dedup, перед записью упоминания распределяются по кластерам
+    почти одинаковых текстов.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        dedup: Optional[MentionDeduplicator] = None
+    ):
+        self.dedup = dedup
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue[Tuple[Platform, Dict]] = asyncio.Queue(maxsize=max_size)
+        self._task: Optional[asyncio.Task] = None
+        self.flushed_batches = 0
+        self.flushed_mentions = 0
+
+    def start(self):
+        """Запускает фоновую задачу записи"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info("Очередь записи упоминаний запущена")
+
+    async def put(self, platform: Platform, mention_data: Dict):
+        """Ставит упоминание в очередь; ждёт, если очередь заполнена"""
+        await self._queue.put((platform, mention_data))
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    async def stop(self):
+        """Дожидается записи всех упоминаний из очереди и останавливает задачу"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        logger.info(
+            f"Очередь записи остановлена (пачек: {self.flushed_batches}, "
+            f"упоминаний: {self.flushed_mentions})"
+        )
+
+    async def _collect_batch(self) -> List[Tuple[Platform, Dict]]:
+        """Набирает пачку упоминаний по размеру или по времени"""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            # Сначала забираем всё, что уже лежит в очереди
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _flush(self, batch: List[Tuple[Platform, Dict]]):
+        """Записывает пачку: одна транзакция на платформу (mentions и её таблица расширения)"""
+        by_platform: Dict[Platform, List[Dict]] = {}
+        for platform, mention_data in batch:
+            by_platform.setdefault(platform, []).append(mention_data)
+
+        if self.dedup is not None:
+            try:
+                await self.dedup.sync()
+            except Exception as e:
+                logger.error(f"Не удалось обновить индекс отпечатков: {e}")
+            for _, mention_data in batch:
+                try:
+                    self.dedup.assign(mention_data)
+                except Exception as e:
+                    # Упоминание пишется без кластера, как при выключенной кластеризации
+                    logger.error(f"Не удалось найти кластер упоминания {mention_data.get('mention_link')}: {e}")
+
+        for platform, mentions in by_platform.items():
+            await self._insert(platform, mentions)
+            self.flushed_mentions += len(mentions)
+        self.flushed_batches += 1
+
+    async def _insert(self, platform: Platform, mentions: List[Dict]) -> List[Dict]:
+        """Пишет пачку одной транзакцией; если она не записалась - по одному упоминанию.
+
+        Ссылки упоминаний уже отмечены «глазами» как просмотренные, поэтому
+        из-за одной плохой строки не теряется вся пачка - только сама строка.
+        """
+        try:
+            return await insert_mentions(platform, mentions)
+        except Exception as e:
+            logger.error(
+                f"Не удалось записать пачку из {len(mentions)} упоминаний {platform.value}, "
+                f"записываю по одному: {e}", exc_info=True
+            )
+        inserted = []
+        for mention_data in mentions:
+            try:
+                inserted.extend(await insert_mentions(platform, [mention_data]))
+            except Exception as e:
+                logger.error(f"Не удалось записать упоминание {platform.value} {mention_data.get('mention_link')}: {e}")
+        return inserted
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                # Задача записи не должна падать: иначе очередь больше никто не разбирает
+                logger.error(f"Не удалось записать пачку из {len(batch)} упоминаний: {e}", exc_info=True)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
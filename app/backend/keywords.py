@@ -0,0 +1,69 @@
+# backend/keywords.py
+
+import asyncio
+import logging
+from typing import Iterable, Optional
+
+from app.backend.db.database import get_active_keywords, get_keywords_version
+from app.backend.matcher import KeywordMatcher
+
+# Настройка логирования
+logger = logging.getLogger("keywords")
+logger.setLevel(logging.INFO)
+
+if not logger.hasHandlers():
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+
+class KeywordRegistry:
+    """Набор ключевых слов с горячей перезагрузкой из таблицы keywords.
+
+    Слова из конфигурации объединяются с активными словами из БД. Фоновая
+    задача раз в poll_interval сверяет отпечаток таблицы keywords и при его
+    изменении собирает новый KeywordMatcher в отдельном потоке, после чего
+    подменяет ссылку self.matcher. Поиск всегда идёт по готовому матчеру и
+    не ждёт перекомпиляции.
+    """
+
+    def __init__(self, static_keywords: Iterable[str] = (), whole_words: bool = True, poll_interval: float = 60.0):
+        self.static_keywords = list(static_keywords)
+        self.whole_words = whole_words
+        self.poll_interval = poll_interval
+        self.matcher = KeywordMatcher(self.static_keywords, whole_words)
+        self._version: Optional[tuple] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> bool:
+        """Пересобирает матчер, если таблица keywords изменилась"""
+        version = await get_keywords_version()
+        if version == self._version:
+            return False
+
+        keywords = [*self.static_keywords, *await get_active_keywords()]
+        matcher = await asyncio.to_thread(KeywordMatcher, keywords, self.whole_words)
+        self.matcher = matcher
+        self._version = version
+        logger.info(f"Набор ключевых слов обновлён: {len(matcher)} слов")
+        return True
+
+    def start(self):
+        """Запускает фоновую проверку изменений"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка при обновлении ключевых слов: {e}")
+            await asyncio.sleep(self.poll_interval)
@@ -6,7 +6,10 @@ import os
 import asyncio
 
 from app.backend.dashboard import router as dashboard_router
-from app.backend.db.database import init_db
+from app.backend.db.database import init_db, close_db
+from app.backend.dedup import MentionDeduplicator
+from app.backend.ingestion import IngestionQueue
+from app.backend.stream import MentionBroker, router as stream_router
 from app.backend.rss_module.rss_eye import Settings, RSSEye
 
 # Инициализация FastAPI
@@ -31,6 +34,7 @@ app.add_middleware(
 
 # Подключение роутеров
 app.include_router(dashboard_router, prefix="/api")
+app.include_router(stream_router, prefix="/api")
 
 # Монтирование статических файлов
 app.mount("/static", StaticFiles(directory="app/frontend/static"), name="static")
@@ -39,23 +43,49 @@ app.mount("/static", StaticFiles(directory="app/frontend/static"), name="static"
 async def root():
     return FileResponse("app/frontend/templates/index.html")
 
+@app.get("/api/rss_eye/hosts")
+async def rss_eye_hosts():
+    # Статистика запросов RSS-модуля по хостам
+    if not hasattr(app.state, 'rss_eye'):
+        return {}
+    return app.state.rss_eye.get_host_stats()
+
 @app.on_event("startup")
 async def startup_event():
     # Инициализация базы данных при запуске
     await init_db()
+
+    # Запуск очереди записи упоминаний; почти одинаковые тексты объединяются в кластеры
+    app.state.ingestion = IngestionQueue(dedup=MentionDeduplicator())
+    app.state.ingestion.start()
+
+    # Рассылка в /api/stream упоминаний всех платформ, сохранённых в БД
+    app.state.broker = MentionBroker()
+    await app.state.broker.start()
     
     # Запуск RSS-модуля
     config = Settings.from_json(os.getenv("RSS_EYE_JSON_CONFIG"))
-    app.state.rss_eye = RSSEye(config)
-    asyncio.create_task(app.state.rss_eye.run())
+    app.state.rss_eye = RSSEye(config, app.state.ingestion)
+    app.state.rss_eye_task = asyncio.create_task(app.state.rss_eye.run())
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    # Остановка RSS-модуля
+    # Остановка RSS-модуля: дожидаемся его цикла, чтобы после него в очередь ничего не попало
     if hasattr(app.state, 'rss_eye'):
         app.state.rss_eye.shutdown_event.set()
+        await asyncio.gather(app.state.rss_eye_task, return_exceptions=True)
         await app.state.rss_eye.close_session()
 
+    # Запись оставшихся в очереди упоминаний
+    if hasattr(app.state, 'ingestion'):
+        await app.state.ingestion.stop()
+
+    if hasattr(app.state, 'broker'):
+        await app.state.broker.stop()
+
+    # Закрытие пула соединений с БД
+    await close_db()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,107 @@
+# backend/matcher.py
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+_WORD_CHAR = re.compile(r"\w")
+
+
+def _trie_pattern(node: Dict) -> str:
+    """Превращает узел префиксного дерева в фрагмент регулярного выражения"""
+    is_terminal = "" in node
+    branches = [
+        re.escape(char) + _trie_pattern(child)
+        for char, child in sorted(node.items())
+        if char != ""
+    ]
+    if not branches:
+        return ""
+    if len(branches) == 1 and not is_terminal:
+        return branches[0]
+    pattern = "(?:" + "|".join(branches) + ")"
+    return pattern + "?" if is_terminal else pattern
+
+
+def build_trie(keywords: Iterable[str]) -> Dict:
+    """Префиксное дерево ключевых слов; пустой ключ отмечает конец слова"""
+    trie: Dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}  # Конец слова
+    return trie
+
+
+def build_keywords_pattern(keywords: Iterable[str]) -> str:
+    """Собирает ключевые слова в префиксное дерево и возвращает одно выражение.
+
+    Общие префиксы сливаются, поэтому на каждой позиции текста движок
+    проходит не больше длины самого длинного ключевого слова, а не
+    перебирает все слова по очереди.
+    """
+    return _trie_pattern(build_trie(keywords))
+
+
+class KeywordMatcher:
+    """Поиск набора ключевых слов за один проход по тексту.
+
+    Ключевые слова компилируются один раз. В режиме whole_words слово
+    должно быть окружено не-буквенными символами (работает и для
+    кириллицы, и для латиницы), иначе ищется подстрока. Регистр не важен.
+
+    search проходит текст одним выражением. find находит выражением
+    позиции, с которых начинается хотя бы одно слово, и от каждой спускается
+    по префиксному дереву, поэтому сообщает и вложенные, и перекрывающиеся
+    слова («Газпром», «Газпром нефть» и «нефть» в тексте «Газпром нефть»).
+    """
+
+    def __init__(self, keywords: Iterable[str], whole_words: bool = True):
+        self.whole_words = whole_words
+        # Нормализованная форма -> исходное написание ключевого слова
+        self._keywords: Dict[str, str] = {}
+        for keyword in keywords:
+            keyword = keyword.strip()
+            if keyword:
+                self._keywords.setdefault(keyword.lower(), keyword)
+
+        self._pattern: Optional[re.Pattern] = None
+        self._starts: Optional[re.Pattern] = None
+        self._trie = build_trie(self._keywords)
+        if self._keywords:
+            pattern = _trie_pattern(self._trie)
+            if whole_words:
+                pattern = rf"(?<!\w)(?:{pattern})(?!\w)"
+            self._pattern = re.compile(pattern)
+            # Пустое совпадение на каждой позиции, где начинается слово
+            self._starts = re.compile(f"(?={pattern})")
+
+    @property
+    def keywords(self) -> List[str]:
+        return list(self._keywords.values())
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def search(self, text: str) -> bool:
+        """Проверяет, встречается ли в тексте хотя бы одно ключевое слово"""
+        if self._pattern is None or not text:
+            return False
+        return self._pattern.search(text.lower()) is not None
+
+    def find(self, text: str) -> List[str]:
+        """Возвращает все найденные ключевые слова в порядке первого появления"""
+        if self._starts is None or not text:
+            return []
+        text = text.lower()
+        hits: Dict[str, None] = {}
+        for match in self._starts.finditer(text):
+            start = match.start()
+            node = self._trie
+            for end in range(start, len(text) + 1):
+                if "" in node and not (self.whole_words and _WORD_CHAR.match(text, end)):
+                    hits.setdefault(self._keywords[text[start:end]], None)
+                if end == len(text) or text[end] not in node:
+                    break
+                node = node[text[end]]
+        return list(hits)
@@ -0,0 +1,221 @@
+# backend/notifications.py
+
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+from app.backend.db.database import (
+    add_notifications,
+    delete_notifications,
+    get_pending_notifications,
+    increment_notification_attempts
+)
+from app.backend.ratelimit import TokenBucket
+
+# Настройка логирования
+logger = logging.getLogger("notifications")
+logger.setLevel(logging.INFO)
+
+if not logger.hasHandlers():
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n"
+
+
+class NotificationDispatcher:
+    """Очередь уведомлений в Telegram-бот с ограничением частоты.
+
+    notify только кладёт уведомление во входную очередь и сразу
+    возвращается, так что обработка упоминаний не ждёт доставки. Фоновая
+    задача сохраняет уведомления в notification_outbox, а для каждого
+    получателя работает своя задача отправки: получатели обслуживаются
+    параллельно, но не чаще chat_rate сообщений в секунду на чат и
+    global_rate на бота. RetryAfter от Bot API приостанавливает отправку
+    на указанное время. Если у получателя накопилось больше
+    digest_threshold уведомлений, они склеиваются в дайджесты. Доставленные
+    уведомления удаляются из outbox, остальные отправятся после перезапуска.
+    """
+
+    def __init__(
+        self,
+        bot,
+        recipients: Iterable[int],
+        channel: str,
+        global_rate: float = 25.0,
+        chat_rate: float = 1.0,
+        digest_threshold: int = 5,
+        max_attempts: int = 5
+    ):
+        self.bot = bot
+        self.recipients = list(recipients)
+        self.channel = channel
+        self.chat_rate = chat_rate
+        self.digest_threshold = digest_threshold
+        self.max_attempts = max_attempts
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+
+        self._intake: asyncio.Queue[Tuple[str, Optional[str]]] = asyncio.Queue()
+        self._pending: Dict[int, Deque[Dict]] = {}
+        self._ready: Dict[int, asyncio.Event] = {}
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._senders: Dict[int, asyncio.Task] = {}
+        self._persist_task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.dropped = 0
+
+    def notify(self, text: str, summary: Optional[str] = None):
+        """Ставит уведомление всем получателям; summary - строка для дайджеста"""
+        self._intake.put_nowait((text, summary))
+
+    async def start(self):
+        """Восстанавливает недоставленные уведомления и запускает отправку"""
+        restored = await get_pending_notifications(self.channel)
+        for notification in restored:
+            self._enqueue(notification)
+        if restored:
+            logger.info(f"{self.channel}: восстановлено недоставленных уведомлений: {len(restored)}")
+        for chat_id in self.recipients:
+            self._chat(chat_id)
+        self._persist_task = asyncio.create_task(self._persist_loop())
+
+    async def stop(self):
+        """Останавливает отправку; неотправленное остаётся в outbox"""
+        tasks = [*self._senders.values(), *([self._persist_task] if self._persist_task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._senders.clear()
+        self._persist_task = None
+
+        # Дописываем в outbox то, что не успели сохранить
+        batch = []
+        while not self._intake.empty():
+            batch.append(self._intake.get_nowait())
+        if batch:
+            await self._persist(batch)
+        logger.info(f"{self.channel}: отправка уведомлений остановлена (отправлено: {self.sent}, отброшено: {self.dropped})")
+
+    def _chat(self, chat_id: int) -> Deque[Dict]:
+        """Очередь получателя; при первом обращении запускает его задачу отправки"""
+        if chat_id not in self._pending:
+            self._pending[chat_id] = deque()
+            self._ready[chat_id] = asyncio.Event()
+            self._buckets[chat_id] = TokenBucket(self.chat_rate)
+            self._senders[chat_id] = asyncio.create_task(self._send_loop(chat_id))
+        return self._pending[chat_id]
+
+    def _enqueue(self, notification: Dict):
+        self._chat(notification["chat_id"]).append(notification)
+        self._ready[notification["chat_id"]].set()
+
+    async def _persist(self, batch: List[Tuple[str, Optional[str]]]):
+        rows = [(chat_id, text, summary) for text, summary in batch for chat_id in self.recipients]
+        try:
+            ids = await add_notifications(self.channel, rows)
+        except Exception as e:
+            # Без outbox уведомления всё равно отправляются, но не переживут перезапуск
+            logger.error(f"{self.channel}: не удалось сохранить уведомления: {e}")
+            ids = [None] * len(rows)
+        for notification_id, (chat_id, text, summary) in zip(ids, rows):
+            self._enqueue({"id": notification_id, "chat_id": chat_id, "text": text, "summary": summary, "attempts": 0})
+
+    async def _persist_loop(self):
+        while True:
+            batch = [await self._intake.get()]
+            while not self._intake.empty():
+                batch.append(self._intake.get_nowait())
+            await self._persist(batch)
+
+    def _take(self, pending: Deque[Dict]) -> Tuple[List[Dict], str]:
+        """Забирает из очереди одно уведомление или дайджест из нескольких"""
+        if len(pending) <= self.digest_threshold:
+            notification = pending.popleft()
+            return [notification], notification["text"]
+
+        batch: List[Dict] = []
+        lines: List[str] = []
+        length = 64  # Запас под заголовок
+        while pending:
+            line = pending[0]["summary"] or pending[0]["text"]
+            if batch and length + len(DIGEST_SEPARATOR) + len(line) > TELEGRAM_MESSAGE_LIMIT:
+                break
+            batch.append(pending.popleft())
+            lines.append(line)
+            length += len(DIGEST_SEPARATOR) + len(line)
+        header = f"📦 <b>Новых упоминаний: {len(batch)}</b>"
+        return batch, DIGEST_SEPARATOR.join([header, *lines])
+
+    async def _forget(self, batch: List[Dict]):
+        """Удаляет уведомления из outbox"""
+        ids = [notification["id"] for notification in batch if notification["id"] is not None]
+        if not ids:
+            return
+        try:
+            await delete_notifications(ids)
+        except Exception as e:
+            logger.error(f"{self.channel}: не удалось удалить уведомления из outbox: {e}")
+
+    async def _send_loop(self, chat_id: int):
+        pending = self._pending[chat_id]
+        ready = self._ready[chat_id]
+        bucket = self._buckets[chat_id]
+        while True:
+            if not pending:
+                ready.clear()
+                await ready.wait()
+                continue
+
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            batch, text = self._take(pending)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+            except TelegramRetryAfter as e:
+                logger.warning(f"{self.channel}: Bot API просит подождать {e.retry_after} с")
+                bucket.pause(e.retry_after)
+                self.global_bucket.pause(e.retry_after)
+                pending.extendleft(reversed(batch))
+                continue
+            except TelegramForbiddenError as e:
+                # Пользователь заблокировал бота: повторять бессмысленно
+                logger.error(f"{self.channel}: получатель {chat_id} недоступен: {e}")
+                self.dropped += len(batch)
+                await self._forget(batch)
+                continue
+            except Exception as e:
+                await self._retry_later(chat_id, batch, e)
+                continue
+
+            self.sent += len(batch)
+            logger.info(f"{self.channel}: уведомление отправлено пользователю {chat_id} (упоминаний: {len(batch)})")
+            await self._forget(batch)
+
+    async def _retry_later(self, chat_id: int, batch: List[Dict], error: Exception):
+        """Возвращает уведомления в очередь или отбрасывает исчерпавшие попытки"""
+        retry, failed = [], []
+        for notification in batch:
+            notification["attempts"] += 1
+            (retry if notification["attempts"] < self.max_attempts else failed).append(notification)
+        logger.error(f"{self.channel}: ошибка отправки пользователю {chat_id}: {error}")
+
+        ids = [notification["id"] for notification in retry if notification["id"] is not None]
+        if ids:
+            try:
+                await increment_notification_attempts(ids)
+            except Exception as e:
+                logger.error(f"{self.channel}: не удалось обновить счётчик попыток: {e}")
+        if failed:
+            logger.error(f"{self.channel}: отброшено уведомлений после {self.max_attempts} попыток: {len(failed)}")
+            self.dropped += len(failed)
+            await self._forget(failed)
+
+        self._pending[chat_id].extendleft(reversed(retry))
+        # Экспоненциальная пауза для этого получателя
+        self._buckets[chat_id].pause(min(2 ** max(n["attempts"] for n in batch), 300))
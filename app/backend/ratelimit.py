@@ -0,0 +1,45 @@
+# backend/ratelimit.py
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Ограничитель частоты по алгоритму «ведро с токенами».
+
+    Токены пополняются со скоростью rate в секунду, но не больше capacity;
+    acquire ждёт, пока токенов хватит. Ожидающие обслуживаются по очереди.
+    pause запрещает выдачу на заданное время (например, по RetryAfter).
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Приостанавливает выдачу токенов на seconds секунд"""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = max(now, self._paused_until)
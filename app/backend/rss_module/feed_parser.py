@@ -0,0 +1,37 @@
+# Разбор лент вне цикла событий. Модуль намеренно лёгкий: он импортируется
+# в дочерних процессах пула и не должен тянуть за собой БД и логгеры.
+
+from typing import Dict
+
+import feedparser
+
+
+def compact_entry(entry: Dict) -> Dict:
+    """Оставляет только поля статьи, которые использует RSSEye"""
+    return {
+        "title": entry.get("title", ""),
+        "summary": entry.get("summary", ""),
+        "description": entry.get("description", ""),
+        "link": entry.get("link", ""),
+        "author": entry.get("author", ""),
+        "published_parsed": entry.get("published_parsed"),
+        "source": {"title": entry.get("source", {}).get("title", "")},
+        "content": [{"value": content.get("value", "")} for content in entry.get("content", [])]
+    }
+
+
+def parse_feed(content: bytes) -> Dict:
+    """Разбирает ленту и возвращает компактный словарь вместо FeedParserDict"""
+    feed = feedparser.parse(content)
+    result = {
+        "bozo": bool(feed.bozo),
+        "bozo_exception": str(feed.get("bozo_exception", "")),
+        "feed": {},
+        "entries": []
+    }
+    if feed.bozo:
+        return result
+    if "title" in feed.feed:
+        result["feed"]["title"] = feed.feed.title
+    result["entries"] = [compact_entry(entry) for entry in feed.entries]
+    return result
@@ -1,28 +1,62 @@
 import argparse
+import hashlib
 from datetime import datetime, timezone, timedelta
 import time
 import logging
 import asyncio
-from typing import Dict, List, Optional
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Literal, Optional
 from urllib.parse import urlparse
 import aiohttp
 from pydantic import BaseModel, HttpUrl
 import json
-from cachetools import TTLCache
-from tenacity import retry, stop_after_attempt, wait_exponential
-import feedparser
-import aiosqlite
-import re
-
-from app.backend.db.database import Platform, insert_mention, add_source, get_active_sources
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from app.backend.db.database import Platform, insert_mention, add_source, get_active_sources, close_db, get_feed_states, save_feed_state
+from app.backend.db.seen_links import SeenLinkIndex
+from app.backend.dedup import MentionDeduplicator
+from app.backend.ingestion import IngestionQueue
+from app.backend.keywords import KeywordRegistry
+from app.backend.rss_module.feed_parser import parse_feed
+from app.backend.rss_module.scheduler import FeedScheduler
+
+# aiohttp сам распаковывает br, если установлен пакет Brotli
+try:
+    import brotli  # noqa: F401
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Способ запуска процессов разбора лент. parse_feed передаётся в них по имени,
+# поэтому должна оставаться функцией уровня модуля feed_parser
+PARSER_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+class HttpSettings(BaseModel):
+    connections_limit: int = 100  # Всего сокетов
+    connections_per_host: int = 4  # Одновременных запросов к одному хосту
+    dns_cache_ttl: int = 300  # секунд
+    keepalive_timeout: float = 30  # секунд
+    connect_timeout: float = 10  # секунд
+    read_timeout: float = 30  # секунд между порциями ответа
+    total_timeout: float = 60  # секунд на весь запрос вместе с чтением тела
+    compression: bool = True  # gzip/deflate, а также br при наличии Brotli
 
 class Settings(BaseModel):
     rss_urls: List[HttpUrl]
     keywords: List[str]
-    check_interval: int = 300  # секунд
+    keywords_poll_interval: int = 60  # секунд
+    check_interval: int = 300  # секунд, начальный интервал проверки ленты
+    min_check_interval: int = 60  # секунд
+    max_check_interval: int = 3600  # секунд
+    fetch_workers: int = 10  # Одновременно проверяемых лент
+    seen_links_horizon: int = 30  # дней
     max_retries: int = 3
-    cache_ttl: int = 3600  # секунд (1 час)
     proxy: Optional[str] = None
+    http: HttpSettings = HttpSettings()
+    parser_executor: Literal["process", "thread"] = "process"  # Где разбирать ленты
+    parser_workers: int = 2
+    max_feed_size: int = 10 * 1024 * 1024  # байт
 
     @classmethod
     def from_json(cls, path: str = "rss_eye_config.json") -> "Settings":
@@ -46,75 +80,194 @@ def setup_logger(name: str, log_file: str, level=logging.INFO) -> logging.Logger
 
 logger = setup_logger("rss_eye", "rss_module.log")
 
+class FeedError(Exception):
+    """Ошибка ленты, которую нет смысла повторять сразу (4xx, битый XML)"""
+
+class HostStats:
+    """Счётчики запросов к одному хосту"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.latency_avg = 0.0  # Сглаженная задержка, секунд
+        self.latency_max = 0.0
+
+    def record(self, latency: float, ok: bool):
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        self.latency_avg += 0.2 * (latency - self.latency_avg) if self.requests > 1 else latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def as_dict(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_avg_ms": round(self.latency_avg * 1000, 1),
+            "latency_max_ms": round(self.latency_max * 1000, 1)
+        }
+
 class RSSEye:
-    def __init__(self, config: Settings):
+    def __init__(self, config: Settings, ingestion: Optional[IngestionQueue] = None):
         self.config = config
+        self.ingestion = ingestion
         self.rss_urls = config.rss_urls
-        self.keywords = config.keywords
+        self.keywords = KeywordRegistry(config.keywords, poll_interval=config.keywords_poll_interval)
+        self.seen_links = SeenLinkIndex(config.seen_links_horizon)
+        self._rejected_matcher = None  # Матчер, по которому отклонены ссылки в seen_links
         self.shutdown_event = asyncio.Event()
-        self.cache = TTLCache(maxsize=100, ttl=config.cache_ttl)
+        # Валидаторы условных запросов: сохранённые и полученные в текущей проверке
+        self.feed_states: Dict[str, Dict] = {}
+        self._pending_states: Dict[str, Dict] = {}
+        self.host_stats: Dict[str, HostStats] = {}
+        self.parser_pool: Executor = (
+            # Не fork: к моменту создания пула в процессе уже есть потоки aiosqlite
+            # и to_thread, и форк их блокировок может подвесить дочерний процесс
+            ProcessPoolExecutor(max_workers=config.parser_workers, mp_context=multiprocessing.get_context(PARSER_START_METHOD))
+            if config.parser_executor == "process"
+            else ThreadPoolExecutor(max_workers=config.parser_workers, thread_name_prefix="feed_parser")
+        )
         self.session = None
 
     async def init_session(self):
         if self.session is None:
+            http = self.config.http
+            connector = aiohttp.TCPConnector(
+                limit=http.connections_limit,
+                limit_per_host=http.connections_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=http.dns_cache_ttl,
+                keepalive_timeout=http.keepalive_timeout
+            )
+            if not http.compression:
+                accept_encoding = "identity"
+            elif BROTLI_AVAILABLE:
+                accept_encoding = "gzip, deflate, br"
+            else:
+                accept_encoding = "gzip, deflate"
             self.session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=30)
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    # sock_read сбрасывается на каждой порции, поэтому медленную ленту ограничивает total
+                    total=http.total_timeout,
+                    connect=http.connect_timeout,
+                    sock_read=http.read_timeout
+                ),
+                headers={"Accept-Encoding": accept_encoding}
             )
 
+    async def read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        """Читает тело ответа, не больше max_feed_size байт"""
+        limit = self.config.max_feed_size
+        if response.content_length is not None and response.content_length > limit:
+            raise FeedError(f"Лента больше допустимого размера: {response.content_length} байт")
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            body.extend(chunk)
+            if len(body) > limit:
+                raise FeedError(f"Лента больше допустимого размера: {limit} байт")
+        return bytes(body)
+
+    def get_host_stats(self) -> Dict[str, Dict]:
+        """Возвращает статистику запросов по хостам"""
+        return {host: stats.as_dict() for host, stats in self.host_stats.items()}
+
     async def close_session(self):
         if self.session:
             await self.session.close()
             self.session = None
 
     @retry(
+        retry=retry_if_exception_type((aiohttp.ClientError, asyncio.TimeoutError)),
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
         reraise=True
     )
     async def fetch_feed(self, url: str) -> Optional[Dict]:
-        """Обновляет RSS-ленту с механизмом повторных попыток"""
-        cache_key = f"feed_{url}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
-
+        """Обновляет RSS-ленту с механизмом повторных попыток.
+
+        Отправляет If-None-Match/If-Modified-Since по сохранённым валидаторам.
+        Возвращает None, если лента не изменилась (304 или тот же хэш тела).
+        Сетевые и серверные ошибки повторяются, остальные сразу вызывают FeedError.
+        """
+        state = self.feed_states.get(url, {})
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+
+        host = urlparse(url).netloc
+        stats = self.host_stats.setdefault(host, HostStats())
+        started = time.monotonic()
+        finished = None  # Время получения ответа, без разбора ленты
+        ok = False
+        stats.in_flight += 1
         try:
             await self.init_session()
-            async with self.session.get(url, proxy=self.config.proxy) as response:
-                if response.status == 200:
-                    content = await response.text()
-                    feed = feedparser.parse(content)
-                    if not feed.bozo:
-                        self.cache[cache_key] = feed
-                        return feed
-                    else:
-                        logger.error(f"Ошибка парсинга ленты: {feed.bozo_exception}")
-                else:
-                    logger.error(f"Ошибка HTTP {response.status} для {url}")
+            async with self.session.get(url, proxy=self.config.proxy, headers=headers) as response:
+                ok = response.status < 400
+                finished = time.monotonic()
+                if response.status == 304:
+                    logger.debug(f"Лента не изменилась (304): {url}")
+                    return None
+                if response.status >= 500:
+                    response.raise_for_status()  # Серверные ошибки повторяем
+                if response.status != 200:
+                    raise FeedError(f"Ошибка HTTP {response.status}")
+                content = await self.read_body(response)
+                finished = time.monotonic()
+                validators = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified")
+                }
         except Exception as e:
             logger.error(f"Ошибка обновления ленты {url}: {str(e)}")
             raise
-        return None
-
-    def contains_keywords(self, entry: Dict) -> bool:
-        """Проверяет, содержит ли статья любое из ключевых слов как целое слово"""
+        finally:
+            stats.in_flight -= 1
+            stats.record((finished or time.monotonic()) - started, ok)
+
+        content_hash = hashlib.blake2b(content, digest_size=16).hexdigest()
+        if content_hash == state.get("content_hash"):
+            logger.debug(f"Лента не изменилась (хэш): {url}")
+            return None
+
+        # Разбор крупной ленты не должен блокировать цикл событий (и дашборд)
+        loop = asyncio.get_running_loop()
+        feed = await loop.run_in_executor(self.parser_pool, parse_feed, content)
+        if feed["bozo"]:
+            logger.error(f"Ошибка парсинга ленты {url}: {feed['bozo_exception']}")
+            raise FeedError(f"Ошибка парсинга ленты: {feed['bozo_exception']}")
+
+        # Валидаторы сохраняются только после обработки ленты
+        self._pending_states[url] = {**validators, "content_hash": content_hash}
+        return feed
+
+    async def commit_feed_state(self, url: str):
+        """Запоминает валидаторы ленты, чтобы следующий запрос был условным"""
+        state = self._pending_states.pop(url, None)
+        if state is None:
+            return
+        await save_feed_state(url, state["etag"], state["last_modified"], state["content_hash"])
+        self.feed_states[url] = state
+
+    def match_keywords(self, entry: Dict) -> List[str]:
+        """Возвращает ключевые слова, встречающиеся в статье как целые слова"""
         # Собираем весь текст в одну строку
         text = " ".join([
             entry.get("title", ""),
             entry.get("summary", ""),
             entry.get("link", ""),
             *[content.get("value", "") for content in entry.get("content", [])]
-        ]).lower()
-        
-        # Для каждого ключевого слова создаем паттерн с границами слов
-        for keyword in self.keywords:
-            # Экранируем специальные символы в ключевом слове
-            escaped_keyword = re.escape(keyword.lower())
-            # Создаем паттерн для поиска целого слова
-            pattern = r'\b' + escaped_keyword + r'\b'
-            if re.search(pattern, text):
-                return True
-        
-        return False
+        ])
+        return self.keywords.matcher.find(text)
+
+    def contains_keywords(self, entry: Dict) -> bool:
+        """Проверяет, содержит ли статья любое из ключевых слов как целое слово"""
+        return bool(self.match_keywords(entry))
 
     def is_google_source(self, source_domain: str) -> tuple[bool, str]:
         """Определяет тип Google-источника и возвращает (is_google, source_type)"""
@@ -171,13 +324,17 @@ class RSSEye:
             "source_type": source_type  # Добавляем тип источника
         }
 
-    async def process_rss_feed(self, url: str):
-        """Обрабатывает одну RSS-ленту"""
+    async def process_rss_feed(self, url: str) -> Optional[int]:
+        """Обрабатывает одну RSS-ленту.
+
+        Возвращает число новых записей в ленте (0, если лента не изменилась)
+        или None при ошибке.
+        """
         logger.info(f"Проверяю RSS-ленту: {url}")
         try:
             feed = await self.fetch_feed(url)
             if not feed:
-                return
+                return 0
 
             # Добавляем источник в базу данных
             source_domain = urlparse(url).netloc
@@ -187,36 +344,70 @@ class RSSEye:
             # Определяем тип источника
             is_google, source_type = self.is_google_source(source_domain)
 
-            for entry in feed.get("entries", []):
+            # Статьи, отклонённые по прежнему набору ключевых слов, проверяются заново
+            if self.keywords.matcher is not self._rejected_matcher:
+                self.seen_links.clear_rejected()
+                self._rejected_matcher = self.keywords.matcher
+
+            # Одна пакетная проверка на всю ленту вместо запроса на каждую статью
+            entries = feed.get("entries", [])
+            new_links = set(await self.seen_links.filter_new(
+                Platform.RSS, (entry.get("link", "") for entry in entries)
+            ))
+            # Для планировщика считаются только статьи, которых раньше не было:
+            # сохранённые и отклонённые ранее ссылки filter_new уже отбросил
+            new_entries = len(new_links)
+
+            for entry in entries:
                 try:
                     link = entry.get("link", "")
-                    if not link:
-                        continue
-                    if await mention_exists(link):
-                        continue  # Уже есть в БД, пропускаем
-
-                    # Для Google News и Alerts пропускаем проверку ключевых слов
-                    if not is_google and not self.contains_keywords(entry):
+                    if link not in new_links:
+                        continue  # Нет ссылки, уже есть в БД или повтор внутри ленты
+                    new_links.discard(link)
+
+                    # Для Google News и Alerts пропускаем проверку ключевых слов,
+                    # но совпадения всё равно сохраняем для статистики
+                    hits = self.match_keywords(entry)
+                    if not is_google and not hits:
+                        self.seen_links.reject(Platform.RSS, link)
                         continue
 
                     mention_data = self.extract_entry_data(entry, url)
-                    await insert_mention(Platform.RSS, mention_data)
+                    mention_data["matched_keywords"] = hits
+                    self.seen_links.add(Platform.RSS, link)
+                    if self.ingestion:
+                        await self.ingestion.put(Platform.RSS, mention_data)
+                    else:
+                        await insert_mention(Platform.RSS, mention_data)
                 except Exception as e:
                     logger.error(f"Ошибка обработки RSS-статьи: {e}", exc_info=True)
 
+            await self.commit_feed_state(url)
+            return new_entries
+
         except Exception as e:
             logger.error(f"Ошибка обработки RSS-ленты {url}: {e}", exc_info=True)
+            return None
 
     async def run(self):
         """Запускает основный цикл"""
+        self.keywords.start()
+        await self.seen_links.warm([Platform.RSS])
+        self.feed_states = await get_feed_states()
+        scheduler = FeedScheduler(
+            (str(url) for url in self.rss_urls),
+            self.process_rss_feed,
+            base_interval=self.config.check_interval,
+            min_interval=self.config.min_check_interval,
+            max_interval=self.config.max_check_interval,
+            workers=self.config.fetch_workers
+        )
         try:
-            while not self.shutdown_event.is_set():
-                await asyncio.gather(
-                    *(self.process_rss_feed(str(url)) for url in self.rss_urls)
-                )
-                await asyncio.sleep(self.config.check_interval)
+            await scheduler.run(self.shutdown_event)
         finally:
+            await self.keywords.stop()
             await self.close_session()
+            self.parser_pool.shutdown(wait=False, cancel_futures=True)
 
 async def main():
     parser = argparse.ArgumentParser(description="Парсер аргументов RSS Eye")
@@ -229,7 +420,9 @@ async def main():
     args = parser.parse_args()
 
     config = Settings.from_json(args.config)
-    app = RSSEye(config)
+    ingestion = IngestionQueue(dedup=MentionDeduplicator())
+    ingestion.start()
+    app = RSSEye(config, ingestion)
     
     try:
         await app.run()
@@ -240,14 +433,8 @@ async def main():
         logger.error(f"Непредвиденная ошибка: {e}", exc_info=True)
     finally:
         await app.close_session()
-
-async def mention_exists(link: str) -> bool:
-    DB_PATH = "app/backend/db/joint.db"
-    query = "SELECT 1 FROM rss_mentions WHERE mention_link = ? LIMIT 1"
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(query, (link,))
-        result = await cursor.fetchone()
-        return result is not None
+        await ingestion.stop()
+        await close_db()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,137 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("rss_eye")
+
+# Предел степени в экспоненциальной задержке ошибочной ленты: дальше
+# задержка всё равно упирается в max_interval, а 2 ** n не переполняет float
+MAX_BACKOFF_EXPONENT = 16
+
+
+class FeedSchedule:
+    """Состояние расписания одной ленты"""
+
+    def __init__(self, url: str, interval: float):
+        self.url = url
+        self.interval = interval
+        self.failures = 0
+        self.checks = 0
+        self.last_check: Optional[float] = None
+        self.publish_rate = 0.0  # Сглаженное число новых записей в секунду
+
+
+class FeedScheduler:
+    """Планировщик проверки лент с индивидуальными интервалами.
+
+    Ленты лежат в куче по времени следующей проверки и разбираются
+    ограниченным пулом воркеров, так что медленная лента не задерживает
+    остальные. Интервал каждой ленты подстраивается под наблюдаемую частоту
+    публикаций: активные ленты проверяются чаще, «спящие» — реже. Для
+    ошибочных лент интервал растёт экспоненциально.
+
+    process(url) должен вернуть число новых записей в ленте или None при ошибке.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        process: Callable[[str], Awaitable[Optional[int]]],
+        base_interval: float,
+        min_interval: float,
+        max_interval: float,
+        workers: int,
+        jitter: float = 0.1,
+        rate_smoothing: float = 0.3
+    ):
+        self.process = process
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.workers = workers
+        self.jitter = jitter
+        self.rate_smoothing = rate_smoothing
+
+        self.feeds: Dict[str, FeedSchedule] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+        # Первые проверки размазываются по базовому интервалу
+        now = time.monotonic()
+        urls = list(dict.fromkeys(urls))
+        for i, url in enumerate(urls):
+            self.feeds[url] = FeedSchedule(url, base_interval)
+            self._push(url, now + base_interval * i / max(len(urls), 1) * jitter)
+
+    def _push(self, url: str, due: float):
+        heapq.heappush(self._heap, (due, next(self._counter), url))
+        self._wakeup.set()
+
+    def _with_jitter(self, delay: float) -> float:
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def next_delay(self, feed: FeedSchedule, new_entries: Optional[int], now: float) -> float:
+        """Обновляет состояние ленты по результату проверки и возвращает задержку"""
+        elapsed = now - feed.last_check if feed.last_check is not None else None
+        feed.last_check = now
+        feed.checks += 1
+
+        if new_entries is None:
+            feed.failures += 1
+            delay = self.base_interval * 2 ** min(feed.failures, MAX_BACKOFF_EXPONENT)
+            return min(self.max_interval, self._with_jitter(delay))
+
+        feed.failures = 0
+        # Первая проверка возвращает всю накопившуюся ленту, по ней частоту не оцениваем
+        if elapsed:
+            rate = new_entries / elapsed
+            feed.publish_rate += self.rate_smoothing * (rate - feed.publish_rate)
+            # Целимся примерно в одну новую запись за проверку
+            target = 1 / feed.publish_rate if feed.publish_rate > 0 else self.max_interval
+            feed.interval = min(self.max_interval, max(self.min_interval, target))
+        return self._with_jitter(feed.interval)
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            url = await queue.get()
+            try:
+                new_entries = await self.process(url)
+            except Exception as e:
+                logger.error(f"Ошибка проверки ленты {url}: {e}", exc_info=True)
+                new_entries = None
+            finally:
+                queue.task_done()
+
+            now = time.monotonic()
+            delay = self.next_delay(self.feeds[url], new_entries, now)
+            self._push(url, now + delay)
+            logger.debug(f"Следующая проверка {url} через {delay:.0f} с")
+
+    async def run(self, shutdown_event: asyncio.Event):
+        """Выдаёт ленты воркерам по мере наступления их времени"""
+        # Очередь не длиннее пула: лента берётся из кучи, только когда есть кому её проверить
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.workers)]
+        try:
+            while not shutdown_event.is_set():
+                self._wakeup.clear()
+                timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                if timeout is None or timeout > 0:
+                    # Ждём наступления срока, перепланирования или остановки
+                    waiters = [asyncio.create_task(self._wakeup.wait()), asyncio.create_task(shutdown_event.wait())]
+                    _, pending = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    for waiter in pending:
+                        waiter.cancel()
+                    continue
+
+                _, _, url = heapq.heappop(self._heap)
+                await queue.put(url)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,236 @@
+# backend/stream.py
+
+import asyncio
+import base64
+import json
+import logging
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.backend.db.database import Platform, get_last_mention_id, get_mentions_after
+from app.backend.dedup import is_duplicate
+
+# Настройка логирования
+logger = logging.getLogger("stream")
+logger.setLevel(logging.INFO)
+
+if not logger.hasHandlers():
+    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+SUBSCRIBER_BUFFER_SIZE = 1000  # Упоминаний в очереди одного клиента
+HEARTBEAT_INTERVAL = 15.0  # Секунд между пустыми комментариями SSE
+RESUME_BATCH_SIZE = 500
+TAIL_INTERVAL = 1.0  # Секунд между проверками новых упоминаний в БД
+
+
+def encode_stream_cursor(last_id: int) -> str:
+    """Курсор потока: id последнего отправленного упоминания"""
+    raw = json.dumps({"id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_stream_cursor(cursor: str) -> int:
+    """Разбирает курсор потока; при ошибке бросает ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return int(json.loads(raw)["id"])
+    except Exception as e:
+        raise ValueError(f"Некорректный курсор потока: {cursor}") from e
+
+
+class Subscription:
+    """Подписка одного клиента с фильтрами и ограниченным буфером"""
+
+    def __init__(
+        self,
+        platform: Optional[Platform] = None,
+        source_id: Optional[str] = None,
+        keyword: Optional[str] = None,
+        duplicates: bool = False,
+        buffer_size: int = SUBSCRIBER_BUFFER_SIZE
+    ):
+        self.platform = platform
+        self.source_id = source_id
+        self.keyword = keyword.lower() if keyword else None
+        self.duplicates = duplicates
+        self.queue: asyncio.Queue[Dict] = asyncio.Queue(maxsize=buffer_size)
+        self.evicted = asyncio.Event()
+
+    def matches(self, mention: Dict) -> bool:
+        if self.platform and mention["platform"] != self.platform.value:
+            return False
+        if self.source_id and mention["source_id"] != self.source_id:
+            return False
+        if not self.duplicates and is_duplicate(mention):
+            return False
+        if self.keyword:
+            return any(keyword.lower() == self.keyword for keyword in mention.get("matched_keywords") or [])
+        return True
+
+
+class MentionBroker:
+    """Рассылка только что сохранённых упоминаний подписчикам.
+
+    Упоминания пишут разные процессы (RSS - очередь записи этого процесса,
+    VK и Telegram - свои), поэтому брокер не ждёт их от писателей, а сам
+    дочитывает таблицу mentions по первичному ключу раз в poll_interval
+    секунд. publish не ждёт клиентов: упоминание кладётся в очередь каждого
+    подходящего подписчика без блокировки. Подписчик, чья очередь
+    переполнена, отключается - он может переподключиться с курсором и
+    дочитать пропущенное из БД.
+    """
+
+    def __init__(self, poll_interval: float = TAIL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._subscribers: Set[Subscription] = set()
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Запускает фоновое чтение новых упоминаний с текущего конца таблицы"""
+        if self._task is None:
+            self._last_id = await get_last_mention_id()
+            self._task = asyncio.create_task(self._tail())
+            logger.info(f"Брокер упоминаний запущен с id {self._last_id}")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _tail(self):
+        while True:
+            try:
+                while True:
+                    mentions = await get_mentions_after(self._last_id, limit=RESUME_BATCH_SIZE)
+                    if mentions:
+                        self._last_id = mentions[-1]["id"]
+                        self.publish(mentions)
+                    if len(mentions) < RESUME_BATCH_SIZE:
+                        break
+            except Exception as e:
+                logger.error(f"Ошибка чтения новых упоминаний: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def subscribe(self, subscription: Subscription) -> Subscription:
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, mentions: Iterable[Dict]):
+        for mention in mentions:
+            for subscription in list(self._subscribers):
+                if not subscription.matches(mention):
+                    continue
+                try:
+                    subscription.queue.put_nowait(mention)
+                except asyncio.QueueFull:
+                    logger.warning("Подписчик не успевает читать поток и отключён")
+                    self.unsubscribe(subscription)
+                    subscription.evicted.set()
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+
+def sse_event(event: str, data: Dict, event_id: Optional[str] = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def mention_events(
+    request: Request,
+    broker: MentionBroker,
+    subscription: Subscription,
+    last_id: Optional[int]
+) -> AsyncIterator[str]:
+    """Поток SSE: сначала пропущенные упоминания из БД, затем новые из брокера"""
+    # Без курсора поток начинается с текущего конца
+    if last_id is None:
+        last_id = await get_last_mention_id()
+    # Подписываемся до дочитывания из БД, чтобы не потерять упоминания между ними;
+    # повторы отсекаются по id
+    broker.subscribe(subscription)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            mentions = await get_mentions_after(
+                last_id, subscription.platform, subscription.source_id, RESUME_BATCH_SIZE
+            )
+            for mention in mentions:
+                last_id = mention["id"]
+                if subscription.matches(mention):
+                    yield sse_event("mention", mention, encode_stream_cursor(last_id))
+            if len(mentions) < RESUME_BATCH_SIZE:
+                break
+
+        yield sse_event("ready", {}, encode_stream_cursor(last_id))
+
+        while True:
+            if subscription.evicted.is_set():
+                yield sse_event("evicted", {"reason": "slow consumer"}, encode_stream_cursor(last_id))
+                return
+            try:
+                mention = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": ping\n\n"
+                continue
+
+            # Уже отправлено при дочитывании из БД
+            if mention["id"] <= last_id:
+                continue
+            last_id = mention["id"]
+            yield sse_event("mention", mention, encode_stream_cursor(last_id))
+    finally:
+        broker.unsubscribe(subscription)
+
+
+router = APIRouter()
+
+
+@router.get("/stream")
+async def stream(
+    request: Request,
+    platform: Optional[str] = None,
+    source_id: Optional[str] = None,
+    keyword: Optional[str] = None,
+    duplicates: bool = False,
+    cursor: Optional[str] = None
+):
+    """Поток новых упоминаний (Server-Sent Events).
+
+    Курсор берётся из параметра cursor или заголовка Last-Event-ID, который
+    EventSource отправляет сам при переподключении. Повторы уже известных
+    текстов (другие упоминания того же кластера) отправляются только с duplicates=true.
+    """
+    broker: Optional[MentionBroker] = getattr(request.app.state, "broker", None)
+    if broker is None:
+        raise HTTPException(status_code=503, detail="Поток упоминаний недоступен")
+
+    cursor = cursor or request.headers.get("last-event-id")
+    try:
+        subscription = Subscription(Platform(platform) if platform else None, source_id, keyword, duplicates)
+        last_id = decode_stream_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logger.info(f"Новый подписчик потока: platform={platform}, source_id={source_id}, keyword={keyword}")
+    return StreamingResponse(
+        mention_events(request, broker, subscription, last_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+from datetime import datetime, timezone
+
+from telethon.errors import FloodWaitError
+from telethon.utils import get_peer_id
+
+from app.backend.db.database import Platform, close_db, get_backfill_state, init_db, insert_mentions, save_backfill_state
+from app.backend.ratelimit import TokenBucket
+from app.backend.telegram_module.telegram_eye.telegram_eye import TelegramEye, load_config, logger
+
+# Столько сообщений Telegram отдаёт за один запрос истории
+HISTORY_PAGE_SIZE = 100
+
+
+class TelegramBackfill:
+    """Загрузка истории чатов с сохранением прогресса.
+
+    Для каждого чата хранится просмотренный диапазон id сообщений. Повторный
+    запуск сначала дочитывает сообщения новее max_message_id, затем
+    продолжает уходить в прошлое от min_message_id, пока история не
+    кончится (или не дойдёт до since). Сообщения фильтруются по ключевым
+    словам локально, совпадения пишутся пачками через insert_mentions.
+    Несколько чатов обрабатываются одновременно, но запросы истории всех
+    чатов делят общий бюджет rate запросов в секунду.
+    """
+
+    def __init__(self, eye: TelegramEye, concurrency: int = 3, rate: float = 1.0, since: datetime = None):
+        self.eye = eye
+        self.client = eye.client
+        self.since = since
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.budget = TokenBucket(rate, capacity=concurrency)
+        self.matched = 0
+        self.scanned = 0
+
+    async def run(self, chats):
+        results = await asyncio.gather(*(self.backfill_chat(chat) for chat in chats), return_exceptions=True)
+        for chat, result in zip(chats, results):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка загрузки истории чата {chat}: {result}", exc_info=result)
+        logger.info(f"Загрузка истории завершена: просмотрено {self.scanned}, найдено упоминаний {self.matched}")
+
+    async def backfill_chat(self, chat):
+        async with self.semaphore:
+            await self.budget.acquire()
+            entity = await self.client.get_entity(chat)
+            self.eye.entities.remember(entity)
+            chat_id = get_peer_id(entity)
+
+            while True:
+                try:
+                    state = await get_backfill_state(chat_id)
+                    if state is not None:
+                        await self._walk(entity, chat_id, state, newer=True)
+                        state = await get_backfill_state(chat_id)
+                    if state is None or not state["complete"]:
+                        await self._walk(entity, chat_id, state, newer=False)
+                    return
+                except FloodWaitError as e:
+                    # Ожидания дольше flood_sleep_threshold Telethon не выжидает сам
+                    logger.warning(f"FLOOD_WAIT при загрузке истории {chat}: жду {e.seconds} с")
+                    self.budget.pause(e.seconds)
+                    await asyncio.sleep(e.seconds)
+
+    async def _walk(self, entity, chat_id, state, newer):
+        """Проходит сообщения новее просмотренного диапазона (newer) или старее его"""
+        low = state["min_message_id"] if state else None
+        high = state["max_message_id"] if state else None
+        complete = state["complete"] if state else False
+        if newer:
+            # От старых к новым, чтобы max_message_id рос без пропусков
+            messages = self.client.iter_messages(entity, reverse=True, min_id=high, wait_time=0)
+        else:
+            messages = self.client.iter_messages(entity, offset_id=low or 0, wait_time=0)
+
+        matcher = self.eye.keywords.matcher
+        batch = []
+        seen = 0
+        exhausted = True
+        async for msg in messages:
+            if not newer and self.since and msg.date < self.since:
+                exhausted = False
+                break
+            seen += 1
+            low = msg.id if low is None else min(low, msg.id)
+            high = msg.id if high is None else max(high, msg.id)
+
+            text = msg.raw_text
+            if text and matcher.search(text):
+                batch.append(await self.eye.build_mention(msg, text, matcher.find(text)))
+
+            # Страница истории обработана: сохраняем найденное и прогресс, ждём бюджета
+            if seen % HISTORY_PAGE_SIZE == 0:
+                await self._flush(chat_id, batch, low, high, complete)
+                batch = []
+                await self.budget.acquire()
+
+        if not newer and exhausted:
+            complete = True
+        await self._flush(chat_id, batch, low or 0, high or 0, complete)
+        self.scanned += seen
+        logger.info(f"Чат {chat_id}: просмотрено {seen} сообщений {'новее' if newer else 'старее'} сохранённого диапазона")
+
+    async def _flush(self, chat_id, batch, low, high, complete):
+        if batch:
+            inserted = await insert_mentions(Platform.TELEGRAM, batch)
+            self.matched += len(inserted)
+        await save_backfill_state(chat_id, low, high, complete)
+
+
+def parse_chat(value):
+    """id чата числом, username - строкой"""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Загрузка истории чатов Telegram")
+    parser.add_argument("chats", nargs="*", type=parse_chat, help="username или id чатов; по умолчанию backfill_chats из конфигурации")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Не уходить в историю дальше этой даты (ISO 8601)")
+    parser.add_argument("--concurrency", type=int, default=3, help="Чатов одновременно")
+    parser.add_argument("--rate", type=float, default=1.0, help="Запросов истории в секунду на все чаты")
+    args = parser.parse_args()
+
+    config = load_config()
+    chats = args.chats or [parse_chat(str(chat)) for chat in config.get("backfill_chats", [])]
+    since = args.since
+    if since and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    telegram_eye = TelegramEye(
+        config['api_id'], config['api_hash'], config['phone'], config['keywords'],
+        config['bot_token'], config['approved_users']
+    )
+    try:
+        await init_db()
+        await telegram_eye.connect_and_authorize()
+        await telegram_eye.keywords.refresh()  # Ключевые слова из общей БД
+        backfill = TelegramBackfill(telegram_eye, args.concurrency, args.rate, since)
+        await backfill.run(chats)
+    finally:
+        await telegram_eye.client.disconnect()
+        await telegram_eye.bot.session.close()
+        await close_db()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Dict, Optional
+
+from cachetools import TTLCache
+from telethon.tl.types import PeerUser
+from telethon.utils import get_peer_id
+
+
+class EntityCache:
+    """Кэш сущностей Telegram (пользователей, чатов, каналов) по id пира.
+
+    Ограничен по размеру (вытесняются давно не использованные) и по времени
+    жизни записи, чтобы изменения username и имён со временем подхватывались.
+    Сущности, пришедшие вместе с обновлением, кладутся в кэш через remember,
+    и запрос к Telegram нужен только для пиров, которых ещё не видели.
+    Одновременные промахи по одному пиру разделяют один запрос.
+    """
+
+    def __init__(self, client, maxsize: int = 10000, ttl: float = 3600.0):
+        self.client = client
+        self._entities: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._loading: Dict[int, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def remember(self, *entities):
+        """Сохраняет уже известные сущности (например, из события)"""
+        for entity in entities:
+            if entity is not None:
+                self._entities[get_peer_id(entity)] = entity
+
+    async def _fetch(self, peer_id: int):
+        try:
+            return await self.client.get_entity(peer_id)
+        except ValueError:
+            # Пользователь, которого нет в кэше сессии Telethon
+            if peer_id > 0:
+                return await self.client.get_entity(PeerUser(peer_id))
+            raise
+
+    async def get(self, peer_id: int):
+        """Возвращает сущность по id пира, запрашивая Telegram только при промахе"""
+        entity = self._entities.get(peer_id)
+        if entity is not None:
+            self.hits += 1
+            return entity
+
+        self.misses += 1
+        task = self._loading.get(peer_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(peer_id))
+            self._loading[peer_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(peer_id, None))
+        entity = await asyncio.shield(task)
+        self._entities[peer_id] = entity
+        return entity
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entities),
+            "hit_rate": self.hits / total if total else None
+        }
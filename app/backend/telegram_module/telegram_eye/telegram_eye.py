@@ -4,13 +4,16 @@ import html
 from datetime import timedelta
 import logging
 import asyncio
-import aiosqlite
 from telethon import TelegramClient, events
-from telethon.tl.types import PeerUser
 from telethon.errors import SessionPasswordNeededError
+from telethon.utils import get_peer_id
 from aiogram import Bot
 
-from backend.db.database import insert_mention
+from app.backend.db.database import Platform, close_db, init_db, insert_mention
+from app.backend.dedup import MentionDeduplicator
+from app.backend.keywords import KeywordRegistry
+from app.backend.notifications import NotificationDispatcher
+from app.backend.telegram_module.telegram_eye.entity_cache import EntityCache
 
 # Настройка логирования
 logger = logging.getLogger("telegram_eye")
@@ -34,21 +37,29 @@ def load_config():
         return json.load(f)
 
 class TelegramEye:
-    def __init__(self, api_id, api_hash, phone, keywords, bot_token, approved_users, db_name='telegram_eye_msgs.db', session_file='MMIS-TGE.session'):
+    def __init__(self, api_id, api_hash, phone, keywords, bot_token, approved_users, session_file='MMIS-TGE.session',
+                 workers=8, queue_size=1000):
         # Инициализация параметров для подключения к Telegram-клиенту, боту и базе данных
         self.api_id = api_id
         self.api_hash = api_hash
         self.phone = phone
         self.session_file = session_file
         self.client = TelegramClient(self.session_file, api_id, api_hash, device_model="Intel Z690", system_version="Windows 10")
-        self.db_name = db_name
-        self.db = None
-        self.keywords = keywords
+        self.entities = EntityCache(self.client)  # Отправители и чаты без повторных запросов к Telegram
+        self.keywords = KeywordRegistry(keywords, whole_words=False)
         self.bot = Bot(token=bot_token)
         self.approved_users = approved_users
+        self.notifier = NotificationDispatcher(self.bot, approved_users, channel="telegram_eye")
+        self.dedup = MentionDeduplicator()  # Повторы уже известных текстов со всех платформ
         self.shutdown_event = asyncio.Event()
         self._is_running = True
 
+        # Конвейер: дешёвый фильтр в обработчике события, тяжёлая обработка - в воркерах
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self._worker_tasks = []
+        self.metrics = {"received": 0, "matched": 0, "processed": 0, "duplicates": 0, "failed": 0, "max_queue_depth": 0}
+
         logger.debug("Создан экземпляр класса TelegramEye.")
 
     def is_running(self) -> bool:
@@ -74,92 +85,141 @@ class TelegramEye:
         except Exception as e:
             logger.error(f"Ошибка при подключении: {e}", exc_info=True)
 
-    # Обрабатывает входящее сообщение и сохраняет его, если оно содержит ключевые слова
+    # Первая ступень: вызывается на каждое новое сообщение во всех чатах.
+    # Только поиск ключевых слов по сырому тексту, без обращения к сущностям;
+    # подходящие сообщения уходят в очередь воркеров
+    async def on_new_message(self, event):
+        self.metrics["received"] += 1
+        message_text = event.raw_text
+        if not message_text or not self.keywords.matcher.search(message_text):
+            return  # Пропускаем сообщение, если ключевые слова отсутствуют
+
+        self.metrics["matched"] += 1
+        # Очередь ограничена: при её заполнении обработчик ждёт воркеров
+        await self.queue.put(event)
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], self.queue.qsize())
+
+    # Вторая ступень: воркеры разбирают очередь подходящих сообщений
+    async def worker(self):
+        while True:
+            event = await self.queue.get()
+            try:
+                await self.process_message(event)
+            finally:
+                self.queue.task_done()
+
+    def start_workers(self):
+        for _ in range(self.workers):
+            self._worker_tasks.append(asyncio.create_task(self.worker()))
+        self._worker_tasks.append(asyncio.create_task(self.report_metrics()))
+
+    # Периодически пишет в лог счётчики конвейера и глубину очереди
+    async def report_metrics(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f"Конвейер сообщений: {self.metrics}, в очереди: {self.queue.qsize()}")
+
+    # Собирает данные упоминания из сообщения: ссылки на чат и сообщение, отправитель.
+    # Используется и для новых сообщений, и при загрузке истории (backfill.py)
+    async def build_mention(self, msg, message_text, hits):
+        # Получаем идентификатор чата
+        chat_id = msg.chat_id
+
+        # Сущности, пришедшие вместе с сообщением, не требуют запросов к Telegram
+        self.entities.remember(msg.sender, msg.chat)
+        chat = await self.entities.get(chat_id)
+
+        # Формирование ссылки на чат:
+        # Если у чата есть username, используем его
+        if getattr(chat, "username", None):
+            chat_link = f"https://t.me/{chat.username}"
+        else:
+            # Если username отсутствует, предполагаем, что это супергруппа.
+            # chat_id для супергруппы имеет вид -100XXXXXXXXX, удаляем префикс "-100"
+            chat_id_str = str(chat_id)
+            if chat_id_str.startswith("-100"):
+                chat_id_str = chat_id_str.replace("-100", "", 1)
+            chat_link = f"https://t.me/c/{chat_id_str}"
+
+        # Формируем ссылку на сообщение.
+        message_id = msg.id
+        message_link = f"https://t.me/c/{chat_id}/{message_id}"
+        if str(chat_id).startswith("-100"):
+            message_link = message_link.replace("-100", "", 1) # Если это супергруппа, аналогично удаляем префикс -100
+
+        # Получаем информацию об отправителе (у постов каналов отправитель - сам канал)
+        user_entity = await self.entities.get(msg.sender_id or chat_id)
+
+        user_id = user_entity.id
+
+        user_name = getattr(user_entity, "username", None) or "Юзернейм отсутствует"  # Получаем username, если он есть
+        user_nick = (  # Имя и фамилия пользователя или название канала
+            f"{getattr(user_entity, 'first_name', None) or ''} {getattr(user_entity, 'last_name', None) or ''}".strip()
+            or getattr(user_entity, "title", "")
+        )
+
+        return {
+            "mention_datetime": msg.date.isoformat(),
+            "mention_link": message_link,
+            "source_id": str(chat_id),
+            "source_link": chat_link,
+            "user_id": str(user_id),
+            "user_name": user_name,
+            "user_nick": user_nick,
+            "mention_text": message_text,
+            "matched_keywords": hits,
+            # Поля telegram_mention_details
+            "chat_id": str(chat_id),
+            "message_id": str(message_id),
+            "reply_to_message_id": str(msg.reply_to_msg_id) if msg.reply_to_msg_id else None,
+            "forward_from_chat_id": str(get_peer_id(msg.fwd_from.from_id)) if msg.fwd_from and msg.fwd_from.from_id else None
+        }
+
+    # Обрабатывает сообщение с ключевыми словами: получает сущности, сохраняет и уведомляет
     async def process_message(self, event):
         try:
             msg = event.message # Сущность сообщения
             message_datetime = msg.date  # Дата сообщения
-            message_text = event.raw_text or "Нет текста"  # Текст сообщения
+            message_text = event.raw_text  # Текст сообщения
 
-            # Проверяем наличие ключевых слов (поиск по подстроке)
-            if not any(keyword.lower() in message_text.lower() for keyword in self.keywords):
-                return  # Пропускаем сообщение, если ключевые слова отсутствуют
+            # Какие именно ключевые слова встретились (поиск по подстроке)
+            hits = self.keywords.matcher.find(message_text)
+            if not hits:
+                return  # Набор слов успел обновиться после фильтра
 
-            # Получаем идентификатор чата
-            chat_id = msg.chat_id
-
-            # Формирование ссылки на чат:
-            # Если у чата есть username, используем его
-            if msg.chat.username:
-                chat_link = f"https://t.me/{msg.chat.username}"
-            else:
-                # Если username отсутствует, предполагаем, что это супергруппа.
-                # chat_id для супергруппы имеет вид -100XXXXXXXXX, удаляем префикс "-100"
-                chat_id_str = str(chat_id)
-                if chat_id_str.startswith("-100"):
-                    chat_id_str = chat_id_str.replace("-100", "", 1)
-                chat_link = f"https://t.me/c/{chat_id_str}"
-
-            # Формируем ссылку на сообщение.
-            message_id = msg.id
-            message_link = f"https://t.me/c/{chat_id}/{message_id}"
-            if str(chat_id).startswith("-100"):
-                message_link = message_link.replace("-100", "", 1) # Если это супергруппа, аналогично удаляем префикс -100
-
-            # Получаем информацию об отправителе
-            user_id = event.sender.id
-            try:
-                user_entity = await self.client.get_entity(msg.sender_id)
-            except ValueError:
-                user_entity = await self.client.get_entity(PeerUser(msg.sender_id))
-
-            user_id = user_entity.id
-
-            user_name = user_entity.username or "Юзернейм отсутствует"  # Получаем username, если он есть
-            user_nick = f"{user_entity.first_name or ''} {user_entity.last_name or ''}".strip()  # Имя и фамилия пользователя
+            mention_data = await self.build_mention(msg, message_text, hits)
+            chat_id = mention_data["source_id"]
+            chat_link = mention_data["source_link"]
+            message_link = mention_data["mention_link"]
+            user_id = mention_data["user_id"]
+            user_name = mention_data["user_name"]
+            user_nick = mention_data["user_nick"]
 
             # Логгируем упоминание
             logger.info(f"[{message_datetime}] {user_nick} ({user_id} @{user_name}) в чате {chat_link} ({chat_id}): {message_text}")
 
+            # Кластер почти одинаковых текстов: повтор сохраняется, но без уведомления
+            await self.dedup.sync()
+            duplicate = self.dedup.assign(mention_data)
+
             # Сохраняем в единую таблицу mentions (platform='telegram')
-            await insert_mention(
-                platform="telegram",
-                mention_datetime=message_datetime.isoformat(),
-                mention_link=message_link,
-                source_id=str(chat_id),
-                source_link=chat_link,
-                user_id=str(user_id),
-                user_name=user_name,
-                user_nick=user_nick,
-                mention_text=message_text
-            )
+            await insert_mention(Platform.TELEGRAM, mention_data)
             logger.info("Упоминание в Telegram сохранено в общую БД.")
 
-            # Пересылаем сообщение в бот
-            await self.notify_bot(message_datetime, message_link, chat_link, user_id, user_name, user_nick, message_text)
+            if duplicate:
+                logger.info(f"Повтор уже известного текста (кластер {mention_data['cluster_id']}), уведомление не отправляется")
+                self.metrics["duplicates"] += 1
+            else:
+                # Ставим уведомление в очередь бота
+                self.notify_bot(message_datetime, message_link, chat_link, user_id, user_name, user_nick, message_text)
+            self.metrics["processed"] += 1
 
         except Exception as e:
+            self.metrics["failed"] += 1
             logger.error(f"Ошибка при обработке сообщения: {e}", exc_info=True)
 
-    # Сохраняет сообщение в базу данных
-    async def save_message_to_db(self, message_datetime, message_link, chat_id, chat_link, user_id, user_name, user_nick, message_text):
-        try:
-            # Формируем запрос к БД
-            sqlite_insert_with_param = """
-                INSERT INTO tg_mentions (message_datetime, message_link, chat_id, chat_link, user_id, user_name, user_nick, message_text)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?);
-            """
-
-            # Заполняем данные для вставки в БД
-            data_tuple = (message_datetime, chat_id, chat_link, user_id, user_name, user_nick, message_link, message_text)
-            await self.db.execute(sqlite_insert_with_param, data_tuple)
-            await self.db.commit()
-            logger.info(f"Сообщение от {user_nick} (@{user_name}) сохранено в базу данных.")
-        except Exception as e:
-            logger.error(f"Ошибка при записи упоминания в БД: {e}", exc_info=True)
-
-    # Отправляет уведомление в Telegram-бот
-    async def notify_bot(self, message_datetime, message_link, chat_link, user_id, user_name, user_nick, message_text):
+    # Ставит уведомление для Telegram-бота в очередь отправки, не дожидаясь доставки
+    def notify_bot(self, message_datetime, message_link, chat_link, user_id, user_name, user_nick, message_text):
         # Преобразуем время в UTC+3 (МСК+0)
         msk_time = message_datetime + timedelta(hours=3)
 
@@ -175,13 +235,11 @@ class TelegramEye:
             f"💬 <b>Текст:</b> {html.escape(message_text)}"
         )
 
-        # Отправляем уведомления всем пользователям из списка approved_users
-        for user in self.approved_users:
-            try:
-                await self.bot.send_message(chat_id=user, text=notification_text, parse_mode="HTML")
-                logger.info(f"Уведомление отправлено пользователю {user}")
-            except Exception as e:
-                logger.error(f"Ошибка при отправке уведомления пользователю {user}: {e}", exc_info=True)
+        # Короткая строка для дайджеста, если уведомлений накопилось много
+        summary = f"➤ Telegram · {html.escape(user_nick)}: <a href=\"{message_link}\">{message_link}</a>"
+
+        # Уведомления всем пользователям из списка approved_users рассылает диспетчер
+        self.notifier.notify(notification_text, summary)
 
     def setup_signal_handler(self) -> None:
         loop = asyncio.get_running_loop()
@@ -197,6 +255,25 @@ class TelegramEye:
         logger.info("Пробую завершить работу правильно...")
         self._is_running = False
 
+        # Остановка обновления ключевых слов
+        await self.keywords.stop()
+
+        # Остановка воркеров; сообщения, оставшиеся в очереди, не обрабатываются
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks.clear()
+
+        logger.info(f"Конвейер сообщений: {self.metrics}, не обработано: {self.queue.qsize()}")
+        logger.info(f"Кэш сущностей: {self.entities.stats()}")
+
+        # Остановка рассылки; недоставленные уведомления остаются в outbox
+        try:
+            await self.notifier.stop()
+            await close_db()
+        except Exception as e:
+            logger.error(f"Ошибка при остановке рассылки уведомлений: {e}", exc_info=True)
+
         # Отключение бота
         try:
             if self.bot:
@@ -213,13 +290,6 @@ class TelegramEye:
         except Exception as e:
             logger.error(f"Ошибка при отключении клиента Telegram: {e}", exc_info=True)
 
-        # Отключение от БД
-        try:
-            if self.db:
-                await self.db.close()
-                logger.info("Соединение с БД закрыто.")
-        except Exception as e:
-            logger.error(f"Ошибка при отключении от БД: {e}", exc_info=True)
 
     async def shutdown(self, sig: signal.Signals) -> None:
         logger.info(f"Получен сигнал {sig.name}, завершаю работу...")
@@ -257,17 +327,21 @@ async def main():
         BOT_TOKEN = config['bot_token']
         APPROVED_USERS = config['approved_users']
         KEYWORDS = config['keywords']
+        WORKERS = config.get('workers', 8)
 
         # Инициализация клиента
-        telegram_eye = TelegramEye(API_ID, API_HASH, PHONE, KEYWORDS, BOT_TOKEN, APPROVED_USERS)
-        await telegram_eye.setup_database()  # Настройка базы данных
+        telegram_eye = TelegramEye(API_ID, API_HASH, PHONE, KEYWORDS, BOT_TOKEN, APPROVED_USERS, workers=WORKERS)
         await telegram_eye.connect_and_authorize()  # Подключение (и авторизация) аккаунта
+        await init_db()  # Общая БД: упоминания, ключевые слова и outbox уведомлений
+        telegram_eye.keywords.start()  # Горячая перезагрузка ключевых слов из общей БД
+        await telegram_eye.notifier.start()  # Рассылка уведомлений в бот
+        telegram_eye.start_workers()  # Воркеры обработки подходящих сообщений
 
         # Обработчик для мониторинга новых сообщений
         @telegram_eye.client.on(events.NewMessage(chats=None))  # None = слушать все чаты
         async def new_message_listener(event):
-            if telegram_eye.is_running:
-                await telegram_eye.process_message(event)
+            if telegram_eye.is_running():
+                await telegram_eye.on_new_message(event)
 
         logger.info("Начинаю обрабатывать сообщения. Для завершения используйте Ctrl+C")
         await telegram_eye.client.run_until_disconnected()
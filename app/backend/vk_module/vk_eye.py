@@ -11,6 +11,11 @@ import vk_api
 from vk_api.longpoll import VkLongPoll, VkEventType
 from aiogram import Bot as TgBot
 
+from app.backend.db.database import Platform, close_db, init_db, insert_mention
+from app.backend.dedup import MentionDeduplicator
+from app.backend.keywords import KeywordRegistry
+from app.backend.notifications import NotificationDispatcher
+
 # Настройка логирования
 def setup_logger(name: str, log_file: str, level=logging.INFO) -> logging.Logger:
     logger = logging.getLogger(name)
@@ -41,9 +46,11 @@ class VKEye:
                  tg_bot_approved_users: List[int], db_name: str = 'vk_eye.db'):
         self.login = login
         self.password = password
-        self.keywords = keywords
+        self.keywords = KeywordRegistry(keywords, whole_words=False)
         self.tg_bot = TgBot(token=tg_bot_token)
         self.tg_bot_approved_users = tg_bot_approved_users
+        self.notifier = NotificationDispatcher(self.tg_bot, tg_bot_approved_users, channel="vk_eye")
+        self.dedup = MentionDeduplicator()  # Повторы уже известных текстов со всех платформ
         self.db_name = db_name
         self.db = None
 
@@ -65,7 +72,7 @@ class VKEye:
     async def database_connection(self):
         if not self.db:
             self.db = await aiosqlite.connect(self.db_name)
-            await self.setup_database()
+            await self.setup_database(self.db)
         try:
             yield self.db
         finally:
@@ -74,80 +81,126 @@ class VKEye:
                 await self.db.close()
                 self.db = None
 
-    async def setup_database(self):
-        query = """
-        CREATE TABLE IF NOT EXISTS vk_mentions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mention_datetime TEXT NOT NULL,
-            source_type TEXT NOT NULL,
-            source_id TEXT,
-            source_name TEXT,
-            mention_link TEXT,
-            user_id INTEGER NOT NULL,
-            user_name TEXT,
-            user_nick TEXT,
-            mention_text TEXT
+    async def setup_database(self, db: aiosqlite.Connection):
+        # Упоминания пишутся в общую БД, локально хранится только состояние
+        # между перезапусками (курсор ленты новостей)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS vk_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
         )
-        """
+        """)
+
+    async def load_last_timestamp(self):
+        async with self.database_connection() as db:
+            cursor = await db.execute("SELECT value FROM vk_state WHERE key = 'last_timestamp'")
+            row = await cursor.fetchone()
+        if row:
+            self.last_timestamp = int(row[0])
+            logger.info(f"Курсор ленты восстановлен: {datetime.datetime.fromtimestamp(self.last_timestamp)}")
+
+    async def save_last_timestamp(self):
         async with self.database_connection() as db:
-            await db.execute(query)
-        logger.info("Таблица упоминаний проверена или создана.")
+            await db.execute(
+                "INSERT OR REPLACE INTO vk_state (key, value) VALUES ('last_timestamp', ?)",
+                (str(self.last_timestamp),)
+            )
+
+    async def call_vk(self, method, **params):
+        """Вызывает синхронный метод vk_api в пуле потоков, не блокируя цикл событий"""
+        return await asyncio.to_thread(method, **params)
+
+    def _connect_to_vk_sync(self):
+        self.vk_session = vk_api.VkApi(self.login, self.password)
+        self.vk_session.auth()
+        self.vk = self.vk_session.get_api()
+        self.longpoll = VkLongPoll(self.vk_session)
 
     async def connect_to_vk(self):
         try:
-            self.vk_session = vk_api.VkApi(self.login, self.password)
-            self.vk_session.auth()
-            self.vk = self.vk_session.get_api()
-            self.longpoll = VkLongPoll(self.vk_session)
+            # Авторизация и создание VkLongPoll делают сетевые запросы
+            await asyncio.to_thread(self._connect_to_vk_sync)
             logger.info("Успешное подключение к VK API")
         except Exception as e:
             logger.error(f"Ошибка подключения к VK API: {e}")
             raise
 
     def contains_keywords(self, text: str) -> bool:
-        return any(keyword.lower() in text.lower() for keyword in self.keywords)
+        return self.keywords.matcher.search(text)
+
+    async def fetch_newsfeed(self, start_time: int, end_time: int):
+        """Перебирает посты ленты за интервал, следуя по страницам next_from"""
+        start_from = None
+        while True:
+            params = dict(filters='post', start_time=start_time, end_time=end_time, count=100)
+            if start_from:
+                params['start_from'] = start_from
+            news = await self.call_vk(self.vk.newsfeed.get, **params)
+
+            # Имена источников приходят отдельно от постов
+            names = {profile['id']: f"{profile.get('first_name', '')} {profile.get('last_name', '')}".strip()
+                     for profile in news.get('profiles', [])}
+            names.update({-group['id']: group.get('name', '') for group in news.get('groups', [])})
+
+            for item in news.get('items', []):
+                yield item, names.get(item.get('source_id'), '')
+
+            start_from = news.get('next_from')
+            if not start_from or not news.get('items'):
+                break
 
     async def process_newsfeed(self):
         try:
-            news = self.vk.newsfeed.get(filters='post', start_time=self.last_timestamp, count=100)
-            self.last_timestamp = int(datetime.datetime.now().timestamp())
+            end_time = int(datetime.datetime.now().timestamp())
 
-            for item in news['items']:
+            async for item, source_name in self.fetch_newsfeed(self.last_timestamp, end_time):
                 post_text = item.get('text', '')
                 if not self.contains_keywords(post_text):
                     continue
 
                 mention_data = {
-                    'mention_datetime': datetime.datetime.fromtimestamp(item['date']).isoformat(),
+                    'mention_datetime': datetime.datetime.fromtimestamp(item['date'], tz=datetime.timezone.utc).isoformat(),
                     'source_type': 'post',
-                    'source_id': item.get('source_id'),
-                    'mention_text': post_text
+                    'source_id': str(item.get('source_id')),
+                    'source_name': source_name,
+                    'mention_link': f"https://vk.com/wall{item.get('source_id')}_{item.get('post_id')}",
+                    'user_id': str(item.get('signer_id') or item.get('source_id')),
+                    'user_name': '',
+                    'user_nick': '',
+                    'mention_text': post_text,
+                    'matched_keywords': self.keywords.matcher.find(post_text),
+                    'post_id': str(item.get('post_id')),
+                    'likes_count': item.get('likes', {}).get('count', 0),
+                    'reposts_count': item.get('reposts', {}).get('count', 0),
+                    'comments_count': item.get('comments', {}).get('count', 0)
                 }
+                await self.dedup.sync()
+                duplicate = self.dedup.assign(mention_data)
                 await self.save_mention_to_db(mention_data)
-                await self.notify_telegram_bot(mention_data)
+                if duplicate:
+                    logger.info(f"Повтор уже известного текста: {mention_data['mention_link']}, уведомление не отправляется")
+                else:
+                    self.notify_telegram_bot(mention_data)
+
+            # Курсор сдвигается только после полной обработки интервала
+            self.last_timestamp = end_time + 1
+            await self.save_last_timestamp()
         except Exception as e:
             logger.error(f"Ошибка обработки новостной ленты: {e}")
 
     async def save_mention_to_db(self, mention_data: Dict):
         try:
-            query = """
-            INSERT INTO vk_mentions (mention_datetime, source_type, source_id, mention_text)
-            VALUES (?, ?, ?, ?)
-            """
-            async with self.database_connection() as db:
-                await db.execute(query, (
-                    mention_data['mention_datetime'],
-                    mention_data['source_type'],
-                    mention_data['source_id'],
-                    mention_data['mention_text']
-                ))
+            # Общая таблица mentions (platform='vk'), счётчики поста - в vk_mention_details
+            await insert_mention(Platform.VK, mention_data)
             logger.info("Упоминание сохранено в БД")
         except Exception as e:
             logger.error(f"Ошибка при записи упоминания в БД: {e}", exc_info=True)
 
-    async def notify_telegram_bot(self, mention_data: Dict):
+    def notify_telegram_bot(self, mention_data: Dict):
+        """Ставит уведомление в очередь отправки, не дожидаясь доставки"""
+        # Время сохраняется в UTC, в уведомлении - МСК (UTC+3)
         mention_datetime = datetime.datetime.fromisoformat(mention_data['mention_datetime'])
-        local_time = mention_datetime - datetime.timedelta(hours=3)
+        local_time = mention_datetime + datetime.timedelta(hours=3)
 
         notification_text = (
             f"🚾 <b>Новое упоминание в VK</b>\n"
@@ -158,15 +211,18 @@ class VKEye:
             f"💬 <b>Текст:</b> {html.escape(mention_data['mention_text'])}"
         )
 
-        for user in self.tg_bot_approved_users:
-            try:
-                await self.tg_bot.send_message(chat_id=user, text=notification_text, parse_mode="HTML")
-                logger.info(f"Уведомление отправлено пользователю {user}.")
-            except Exception as e:
-                logger.error(f"Ошибка при отправке уведомления пользователю {user}: {e}")
+        summary = (
+            f"🚾 VK · {html.escape(mention_data['source_name'])}: "
+            f"<a href=\"{mention_data['mention_link']}\">{mention_data['mention_link']}</a>"
+        )
+        self.notifier.notify(notification_text, summary)
 
     async def run(self):
+        await self.load_last_timestamp()
+        await init_db()
+        await self.notifier.start()
         await self.connect_to_vk()
+        self.keywords.start()
         self._tasks.append(asyncio.create_task(self.process_newsfeed_loop()))
         await self.shutdown_event.wait()
         await self.graceful_shutdown()
@@ -181,6 +237,9 @@ class VKEye:
         for task in self._tasks:
             task.cancel()
         await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.keywords.stop()
+        await self.notifier.stop()
+        await close_db()
         if self.db:
             await self.db.close()
         await self.tg_bot.session.close()
@@ -5,9 +5,19 @@ let currentFilters = {
     end_date: '',
     source_id: '',
     limit: 100,
-    offset: 0
+    cursor: '',
+    direction: 'next'
 };
 
+// Курсоры соседних страниц из последнего ответа сервера
+let pageCursors = {
+    next: null,
+    prev: null
+};
+
+// Поток новых упоминаний (Server-Sent Events)
+let mentionStream = null;
+
 // Загрузка данных при загрузке страницы
 document.addEventListener('DOMContentLoaded', () => {
     // Установка начальных дат
@@ -28,21 +38,27 @@ function setupEventListeners() {
     // Обработка формы фильтров
     document.getElementById('filterForm').addEventListener('submit', (e) => {
         e.preventDefault();
-        currentFilters.offset = 0; // Сброс пагинации при изменении фильтров
+        // Сброс пагинации при изменении фильтров
+        currentFilters.cursor = '';
+        currentFilters.direction = 'next';
         loadData();
     });
 
     // Обработка кнопок пагинации
     document.getElementById('prevPage').addEventListener('click', () => {
-        if (currentFilters.offset >= currentFilters.limit) {
-            currentFilters.offset -= currentFilters.limit;
+        if (pageCursors.prev) {
+            currentFilters.cursor = pageCursors.prev;
+            currentFilters.direction = 'prev';
             loadData();
         }
     });
 
     document.getElementById('nextPage').addEventListener('click', () => {
-        currentFilters.offset += currentFilters.limit;
-        loadData();
+        if (pageCursors.next) {
+            currentFilters.cursor = pageCursors.next;
+            currentFilters.direction = 'next';
+            loadData();
+        }
     });
 }
 
@@ -77,7 +93,17 @@ async function loadData() {
         updateSources(data.sources);
         
         // Обновление состояния кнопок пагинации
-        updatePaginationButtons(data.mentions.length);
+        pageCursors.next = data.next_cursor;
+        pageCursors.prev = data.prev_cursor;
+        updatePaginationButtons();
+
+        // На первой странице новые упоминания появляются сразу
+        if (!currentFilters.cursor) {
+            subscribeToStream();
+        } else if (mentionStream) {
+            mentionStream.close();
+            mentionStream = null;
+        }
     } catch (error) {
         console.error('Ошибка при загрузке данных:', error);
         alert('Произошла ошибка при загрузке данных');
@@ -100,15 +126,52 @@ function updateTable(mentions) {
     }
 
     mentions.forEach(mention => {
-        const row = document.createElement('tr');
-        row.innerHTML = `
-            <td>${formatDate(mention.mention_datetime)}</td>
-            <td>${formatPlatform(mention.platform)}</td>
-            <td>${mention.source_id}</td>
-            <td>${mention.mention_text}</td>
-            <td><a href="${mention.mention_link}" target="_blank" class="link-orange">Открыть</a></td>
-        `;
-        tbody.appendChild(row);
+        tbody.appendChild(createMentionRow(mention));
+    });
+}
+
+// Строка таблицы для одного упоминания
+function createMentionRow(mention) {
+    const row = document.createElement('tr');
+    row.innerHTML = `
+        <td>${formatDate(mention.mention_datetime)}</td>
+        <td>${formatPlatform(mention.platform)}</td>
+        <td>${mention.source_id}</td>
+        <td>${mention.mention_text}</td>
+        <td><a href="${mention.mention_link}" target="_blank" class="link-orange">Открыть</a></td>
+    `;
+    return row;
+}
+
+// Подписка на поток новых упоминаний с текущими фильтрами
+function subscribeToStream() {
+    if (mentionStream) {
+        mentionStream.close();
+    }
+    const params = new URLSearchParams();
+    if (currentFilters.platform) params.set('platform', currentFilters.platform);
+    if (currentFilters.source_id) params.set('source_id', currentFilters.source_id);
+
+    // При обрыве EventSource переподключается сам и передаёт Last-Event-ID,
+    // сервер досылает пропущенное
+    mentionStream = new EventSource(`/api/stream?${params}`);
+    mentionStream.addEventListener('mention', (event) => {
+        const mention = JSON.parse(event.data);
+        const tbody = document.getElementById('mentionsTable');
+        // Убираем заглушку пустой таблицы
+        if (tbody.querySelector('td[colspan]')) {
+            tbody.innerHTML = '';
+        }
+        tbody.prepend(createMentionRow(mention));
+        while (tbody.rows.length > currentFilters.limit) {
+            tbody.deleteRow(-1);
+        }
+    });
+    mentionStream.addEventListener('evicted', () => {
+        // Сервер отключил отстающего клиента: перечитываем страницу целиком
+        mentionStream.close();
+        mentionStream = null;
+        loadData();
     });
 }
 
@@ -143,12 +206,12 @@ function updateSources(sources) {
 }
 
 // Обновление состояния кнопок пагинации
-function updatePaginationButtons(mentionsCount) {
+function updatePaginationButtons() {
     const prevButton = document.getElementById('prevPage');
     const nextButton = document.getElementById('nextPage');
     
-    prevButton.disabled = currentFilters.offset === 0;
-    nextButton.disabled = mentionsCount < currentFilters.limit;
+    prevButton.disabled = !pageCursors.prev;
+    nextButton.disabled = !pageCursors.next;
     
     // Добавляем/убираем класс disabled для стилизации
     if (prevButton.disabled) {
@@ -0,0 +1,237 @@
+# benchmarks/bench_db.py
+#
+# Запросы дашборда на большой синтетической joint.db.
+# Запуск: python -m benchmarks.bench_db --mentions 1000000
+# Повторный запуск на той же БД (догенерирует недостающее до --mentions):
+#         python -m benchmarks.bench_db --db /tmp/bench_joint.db --mentions 1000000
+
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from fastapi import FastAPI
+
+from app.backend.dashboard import router as dashboard_router
+from app.backend.db import database
+from app.backend.db.archive import MentionArchive
+from app.backend.db.database import Platform
+from benchmarks.feed_server import VOCABULARY
+from benchmarks.report import LatencyRecorder, write_report
+
+SOURCES_PER_PLATFORM = 200
+KEYWORDS = [f"ключ{i}" for i in range(50)]
+KEYWORD_RATE = 0.3  # Доля упоминаний с найденным ключевым словом (остальные - Google News и т.п.)
+
+
+def make_mention(rng: random.Random, platform: Platform, number: int, ts: float) -> Dict:
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(15, 80))]
+    matched = []
+    if rng.random() < KEYWORD_RATE:
+        matched = rng.sample(KEYWORDS, rng.randint(1, 2))
+        for keyword in matched:
+            words[rng.randrange(len(words))] = keyword
+    source = rng.randrange(SOURCES_PER_PLATFORM)
+    mention = {
+        "mention_datetime": datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc).isoformat(),
+        "mention_ts": int(ts),
+        "mention_link": f"https://bench.local/{platform.value}/{number}",
+        "source_id": f"{platform.value}-{source}",
+        "source_link": f"https://bench.local/{platform.value}/sources/{source}",
+        "user_id": str(rng.randrange(100000)),
+        "user_name": rng.choice(VOCABULARY),
+        "mention_text": " ".join(words),
+        "matched_keywords": matched,
+    }
+    if platform == Platform.RSS:
+        mention.update(feed_url=mention["source_link"], entry_title=" ".join(words[:8]), source_type="other")
+    elif platform == Platform.VK:
+        mention.update(post_id=str(number), likes_count=rng.randrange(100))
+    else:
+        mention.update(chat_id=mention["source_id"], message_id=str(number))
+    return mention
+
+
+async def count_mentions() -> int:
+    async with database.reader_connection() as db:
+        (count,) = await (await db.execute("SELECT COUNT(*) FROM mentions")).fetchone()
+        return count
+
+
+async def populate(total: int, batch_size: int, days: int, seed: int) -> Dict:
+    """Догенерирует упоминания до total штатным insert_mentions (с триггерами агрегатов и FTS)"""
+    for platform in Platform:
+        for source in range(SOURCES_PER_PLATFORM):
+            await database.add_source(
+                platform, f"{platform.value}-{source}", f"Источник {source}",
+                f"https://bench.local/{platform.value}/sources/{source}"
+            )
+    for keyword in KEYWORDS:
+        await database.add_keyword(keyword)
+
+    existing = await count_mentions()
+    missing = max(total - existing, 0)
+    rng = random.Random(seed + existing)
+    now = time.time()
+    platforms = list(Platform)
+    started = time.perf_counter()
+    for offset in range(0, missing, batch_size):
+        size = min(batch_size, missing - offset)
+        batches: Dict[Platform, List[Dict]] = {}
+        for number in range(existing + offset, existing + offset + size):
+            platform = rng.choice(platforms)
+            ts = now - rng.random() * days * 86400
+            batches.setdefault(platform, []).append(make_mention(rng, platform, number, ts))
+        for platform, mentions in batches.items():
+            await database.insert_mentions(platform, mentions)
+        print(f"Сгенерировано {offset + size} из {missing}", end="\r", flush=True)
+    elapsed = time.perf_counter() - started
+    if missing:
+        print()
+    return {
+        "existing": existing,
+        "generated": missing,
+        "elapsed_s": round(elapsed, 3),
+        "mentions_per_s": round(missing / elapsed, 1) if missing else None,
+    }
+
+
+async def asgi_get(app: FastAPI, path: str, params: Dict) -> Tuple[int, bytes]:
+    """GET-запрос к ASGI-приложению без HTTP-сервера и клиента"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": urlencode({k: v for k, v in params.items() if v is not None}).encode(),
+        "headers": [(b"host", b"bench.local")],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench.local", 80),
+    }
+    status = 0
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(body)
+
+
+def random_window(rng: random.Random, days: int, width_days: int) -> Tuple[str, str]:
+    end = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=rng.random() * max(days - width_days, 0))
+    start = end - datetime.timedelta(days=width_days)
+    return start.isoformat(), end.isoformat()
+
+
+def random_platform(rng: random.Random) -> Optional[Platform]:
+    return rng.choice([None, *Platform])
+
+
+async def bench_queries(queries: int, pages: int, days: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    recorder = LatencyRecorder()
+    app = FastAPI()
+    app.include_router(dashboard_router, prefix="/api")
+
+    for _ in range(queries):
+        start_date, end_date = random_window(rng, days, 7)
+        with recorder.measure("get_mentions_offset"):
+            await database.get_mentions(
+                platform=random_platform(rng), start_date=start_date, end_date=end_date,
+                limit=100, offset=rng.randrange(0, 1000, 100)
+            )
+
+        platform = rng.choice(list(Platform))
+        with recorder.measure("get_mentions_source"):
+            await database.get_mentions(
+                platform=platform, source_id=f"{platform.value}-{rng.randrange(SOURCES_PER_PLATFORM)}", limit=100
+            )
+
+        with recorder.measure("get_mentions_page_first"):
+            page = await database.get_mentions_page(platform=random_platform(rng), start_date=start_date, end_date=end_date)
+
+    # Глубокое листание одной и той же выборки
+    page = await database.get_mentions_page(limit=100)
+    for _ in range(pages):
+        if not page["next_cursor"]:
+            break
+        with recorder.measure("get_mentions_page_deep"):
+            page = await database.get_mentions_page(limit=100, cursor=page["next_cursor"])
+
+    for _ in range(queries):
+        platform = random_platform(rng)
+        params = {"platform": platform.value if platform else None}
+        with recorder.measure("dashboard_data"):
+            status, body = await asgi_get(app, "/api/dashboard_data", params)
+        if status != 200:
+            raise RuntimeError(f"dashboard_data вернул {status}: {body[:200]!r}")
+
+        start_date, end_date = random_window(rng, days, 30)
+        with recorder.measure("dashboard_data_offset"):
+            await asgi_get(app, "/api/dashboard_data", {
+                **params, "start_date": start_date, "end_date": end_date, "offset": rng.randrange(100, 1000, 100)
+            })
+
+    return recorder.summary()
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    try:
+        await database.init_db()
+        generation = await populate(args.mentions, args.batch, args.days, args.seed)
+        mentions = await count_mentions()
+        queries = await bench_queries(args.queries, args.pages, args.days, args.seed)
+    finally:
+        await database.close_db()
+    return {
+        "mentions": mentions,
+        "db_size_mb": round(os.path.getsize(database.DB_PATH) / 2 ** 20, 1),
+        "generation": generation,
+        "latency": queries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запросов дашборда на большой БД")
+    parser.add_argument("--mentions", type=int, default=1_000_000, help="Сколько упоминаний должно быть в БД")
+    parser.add_argument("--batch", type=int, default=5000, help="Упоминаний в одной пачке генерации")
+    parser.add_argument("--days", type=int, default=365, help="За сколько дней распределены упоминания")
+    parser.add_argument("--queries", type=int, default=200, help="Запросов каждого вида")
+    parser.add_argument("--pages", type=int, default=200, help="Страниц глубокого листания")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="Файл БД; по умолчанию временный")
+    parser.add_argument("-o", "--output", help="Сохранить отчёт JSON в файл")
+    args = parser.parse_args()
+
+    for name in ("joint_db", "dashboard"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    scratch = tempfile.mkdtemp(prefix="bench_db_")
+    database.DB_PATH = args.db or os.path.join(scratch, "joint.db")
+    database.mention_archive = MentionArchive(os.path.join(scratch, "archive"))
+
+    results = asyncio.run(run(args))
+    params = {key: value for key, value in vars(args).items() if key != "output"}
+    write_report("db", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/bench_matcher.py
+#
+# Сравнение KeywordMatcher с прежним поиском ключевых слов по одному.
+# Перед замерами проверяется, что find находит те же слова, что и прежний поиск,
+# включая вложенные и перекрывающиеся.
+# Запуск: python -m benchmarks.bench_matcher --keywords 10 100 500
+
+import argparse
+import random
+import re
+import time
+from typing import Callable, List, Set
+
+from app.backend.matcher import KeywordMatcher
+
+LATIN = "abcdefghijklmnopqrstuvwxyz"
+
+# (ключевые слова, текст, ожидаемые слова для whole_words=True и False)
+OVERLAP_CASES = [
+    (["Газпром", "Газпром нефть", "нефть"], "Акции Газпром нефть выросли",
+     {"Газпром", "Газпром нефть", "нефть"}, {"Газпром", "Газпром нефть", "нефть"}),
+    (["abc", "bcd"], "abcd abc", {"abc"}, {"abc", "bcd"}),
+    (["банк", "сбербанк", "ербан"], "Сбербанк и банк", {"сбербанк", "банк"}, {"сбербанк", "банк", "ербан"}),
+]
+CYRILLIC = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+
+
+def random_word(rng: random.Random) -> str:
+    alphabet = CYRILLIC if rng.random() < 0.7 else LATIN
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(3, 10)))
+
+
+def make_texts(rng: random.Random, keywords: List[str], count: int, words: int) -> List[str]:
+    """Генерирует тексты, примерно в каждом десятом из которых есть ключевое слово"""
+    texts = []
+    for _ in range(count):
+        tokens = [random_word(rng) for _ in range(words)]
+        if rng.random() < 0.1:
+            tokens[rng.randrange(words)] = rng.choice(keywords).upper()
+        texts.append(" ".join(tokens) + ".")
+    return texts
+
+
+def legacy_whole_words(keywords: List[str]) -> Callable[[str], bool]:
+    """Прежний RSSEye.contains_keywords: отдельное выражение на каждое слово"""
+    def contains(text: str) -> bool:
+        text = text.lower()
+        for keyword in keywords:
+            pattern = r'\b' + re.escape(keyword.lower()) + r'\b'
+            if re.search(pattern, text):
+                return True
+        return False
+    return contains
+
+
+def legacy_substring(keywords: List[str]) -> Callable[[str], bool]:
+    """Прежний поиск VKEye/TelegramEye: подстрока с lower() на каждое слово"""
+    def contains(text: str) -> bool:
+        return any(keyword.lower() in text.lower() for keyword in keywords)
+    return contains
+
+
+def legacy_find(keywords: List[str], whole_words: bool) -> Callable[[str], Set[str]]:
+    """Прежний find: каждое слово ищется отдельно, поэтому находятся и вложенные"""
+    def find(text: str) -> Set[str]:
+        text = text.lower()
+        if whole_words:
+            return {keyword for keyword in keywords if re.search(r'\b' + re.escape(keyword.lower()) + r'\b', text)}
+        return {keyword for keyword in keywords if keyword.lower() in text}
+    return find
+
+
+def check_find(keywords: List[str], texts: List[str]) -> int:
+    """Число текстов, где KeywordMatcher.find расходится с прежним поиском"""
+    mismatches = 0
+    for whole_words in (True, False):
+        matcher = KeywordMatcher(keywords, whole_words)
+        legacy = legacy_find(keywords, whole_words)
+        mismatches += sum(1 for text in texts if set(matcher.find(text)) != legacy(text))
+    return mismatches
+
+
+def check_overlaps() -> bool:
+    ok = True
+    for keywords, text, whole, substring in OVERLAP_CASES:
+        for whole_words, expected in ((True, whole), (False, substring)):
+            found = set(KeywordMatcher(keywords, whole_words).find(text))
+            if found != expected or found != legacy_find(keywords, whole_words)(text):
+                print(f"find({text!r}, whole_words={whole_words}): {sorted(found)}, ожидалось {sorted(expected)}")
+                ok = False
+    return ok
+
+
+def measure(func: Callable[[str], bool], texts: List[str]) -> tuple[float, int]:
+    start = time.perf_counter()
+    hits = sum(1 for text in texts if func(text))
+    return time.perf_counter() - start, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска ключевых слов")
+    parser.add_argument("--keywords", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=120, help="Слов в одном тексте")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if not check_overlaps():
+        raise SystemExit("KeywordMatcher.find теряет вложенные или перекрывающиеся слова")
+
+    rng = random.Random(args.seed)
+    print(f"{'слов':>6} {'режим':<10} {'было, мс':>10} {'стало, мс':>10} {'ускорение':>10}")
+    for keywords_count in args.keywords:
+        keywords = list({random_word(rng) for _ in range(keywords_count)})
+        texts = make_texts(rng, keywords, args.texts, args.words)
+        mismatches = check_find(keywords, texts)
+        if mismatches:
+            print(f"find расходится с прежним поиском в {mismatches} текстах")
+
+        cases = [
+            ("слова", legacy_whole_words(keywords), KeywordMatcher(keywords).search),
+            ("подстрока", legacy_substring(keywords), KeywordMatcher(keywords, whole_words=False).search),
+        ]
+        for mode, legacy, compiled in cases:
+            legacy_time, legacy_hits = measure(legacy, texts)
+            compiled_time, compiled_hits = measure(compiled, texts)
+            if legacy_hits != compiled_hits:
+                print(f"Расхождение в режиме {mode}: {legacy_hits} != {compiled_hits}")
+            print(
+                f"{len(keywords):>6} {mode:<10} {legacy_time * 1000:>10.1f} "
+                f"{compiled_time * 1000:>10.1f} {legacy_time / compiled_time:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
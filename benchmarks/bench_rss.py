@@ -0,0 +1,181 @@
+# benchmarks/bench_rss.py
+#
+# Пропускная способность RSSEye на синтетических лентах.
+# Сервер лент запускается в отдельном процессе, упоминания пишутся во
+# временную joint.db.
+# Запуск: python -m benchmarks.bench_rss --feeds 2000 --rounds 3
+#         python -m benchmarks.bench_rss --mode run --duration 60
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+import aiohttp
+
+from app.backend.db import database
+from app.backend.db.archive import MentionArchive
+from app.backend.dedup import MentionDeduplicator
+from app.backend.ingestion import IngestionQueue
+from app.backend.rss_module.rss_eye import HttpSettings, RSSEye, Settings
+from benchmarks.feed_server import DEFAULT_KEYWORDS, SyntheticFeeds, add_arguments, feed_options, run_process
+from benchmarks.report import LatencyRecorder, write_report
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def count_mentions() -> int:
+    async with database.reader_connection() as db:
+        (count,) = await (await db.execute("SELECT COUNT(*) FROM mentions")).fetchone()
+        return count
+
+
+async def process_rounds(eye: RSSEye, urls, rounds: int, workers: int, recorder: LatencyRecorder) -> list:
+    """Проверяет все ленты rounds раз через process_rss_feed, не больше workers одновременно"""
+    semaphore = asyncio.Semaphore(workers)
+
+    async def check(url):
+        async with semaphore:
+            with recorder.measure("process_rss_feed"):
+                return await eye.process_rss_feed(url)
+
+    await eye.keywords.refresh()
+    await eye.seen_links.warm([database.Platform.RSS])
+    round_times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await asyncio.gather(*(check(url) for url in urls))
+        round_times.append(time.perf_counter() - started)
+    return round_times
+
+
+async def run_for(eye: RSSEye, duration: float, recorder: LatencyRecorder):
+    """Запускает RSSEye.run со штатным планировщиком на duration секунд"""
+    process = eye.process_rss_feed
+
+    async def timed(url):
+        with recorder.measure("process_rss_feed"):
+            return await process(url)
+
+    eye.process_rss_feed = timed
+    task = asyncio.create_task(eye.run())
+    await asyncio.sleep(duration)
+    eye.shutdown_event.set()
+    await task
+
+
+async def bench(args: argparse.Namespace, base_url: str) -> dict:
+    urls = SyntheticFeeds.urls(base_url, args.feeds)
+    config = Settings(
+        rss_urls=urls,
+        keywords=list(DEFAULT_KEYWORDS),
+        check_interval=args.check_interval,
+        min_check_interval=args.check_interval,
+        fetch_workers=args.workers,
+        parser_executor=args.parser_executor,
+        parser_workers=args.parser_workers,
+        http=HttpSettings(connections_per_host=args.workers)  # Все ленты на одном хосте
+    )
+    ingestion = IngestionQueue(dedup=MentionDeduplicator())
+    eye = RSSEye(config, ingestion)
+    recorder = LatencyRecorder()
+
+    await database.init_db()
+    ingestion.start()
+    started = time.perf_counter()
+    try:
+        if args.mode == "process":
+            round_times = await process_rounds(eye, urls, args.rounds, args.workers, recorder)
+        else:
+            round_times = []
+            await run_for(eye, args.duration, recorder)
+        await ingestion.stop()
+        elapsed = time.perf_counter() - started
+    finally:
+        await eye.close_session()
+        eye.parser_pool.shutdown(wait=True)
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{base_url}/stats") as response:
+            server_stats = await response.json()
+
+    checks = len(recorder.samples.get("process_rss_feed", []))
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "feed_checks": checks,
+        "feed_checks_per_s": round(checks / elapsed, 1),
+        "round_s": [round(t, 3) for t in round_times],
+        "mentions": await count_mentions(),
+        "mentions_per_s": round(ingestion.flushed_mentions / elapsed, 1),
+        "duplicates": ingestion.dedup.duplicates,
+        "latency": recorder.summary(),
+        "server": server_stats,
+    }
+
+
+async def run(args: argparse.Namespace, base_url: str) -> dict:
+    try:
+        return await bench(args, base_url)
+    finally:
+        await database.close_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк RSSEye на синтетических лентах")
+    add_arguments(parser)
+    parser.add_argument("--mode", choices=["process", "run"], default="process",
+                        help="process - раунды process_rss_feed по всем лентам, run - штатный цикл RSSEye.run")
+    parser.add_argument("--rounds", type=int, default=3, help="Раундов в режиме process")
+    parser.add_argument("--duration", type=float, default=60, help="Секунд в режиме run")
+    parser.add_argument("--check-interval", type=int, default=5, help="Интервал проверки ленты в режиме run, секунд")
+    parser.add_argument("--workers", type=int, default=50, help="Одновременно проверяемых лент")
+    parser.add_argument("--parser-executor", choices=["process", "thread"], default="process")
+    parser.add_argument("--parser-workers", type=int, default=2)
+    parser.add_argument("--db", help="Файл БД; по умолчанию временный")
+    parser.add_argument("-o", "--output", help="Сохранить отчёт JSON в файл")
+    args = parser.parse_args()
+
+    # Журнал каждой проверки ленты исказил бы замер
+    logging.getLogger("rss_eye").setLevel(logging.WARNING)
+    logging.getLogger("joint_db").setLevel(logging.WARNING)
+
+    scratch = tempfile.mkdtemp(prefix="bench_rss_")
+    database.DB_PATH = args.db or os.path.join(scratch, "joint.db")
+    database.mention_archive = MentionArchive(os.path.join(scratch, "archive"))
+
+    # Сервер в отдельном процессе, чтобы генерация лент не делила с RSSEye цикл событий
+    port = free_port()
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    server = context.Process(target=run_process, args=(feed_options(args), "127.0.0.1", port, ready), daemon=True)
+    server.start()
+    try:
+        if not ready.wait(30):
+            raise RuntimeError("Сервер лент не запустился")
+        results = asyncio.run(run(args, f"http://127.0.0.1:{port}"))
+    finally:
+        server.terminate()
+        server.join()
+
+    params = {
+        **feed_options(args),
+        "mode": args.mode,
+        "rounds": args.rounds if args.mode == "process" else None,
+        "duration": args.duration if args.mode == "run" else None,
+        "workers": args.workers,
+        "parser_executor": args.parser_executor,
+        "parser_workers": args.parser_workers,
+    }
+    write_report("rss", params, results, args.output)
+
+
+if __name__ == "__main__":
+    main()
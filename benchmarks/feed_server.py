@@ -0,0 +1,213 @@
+# benchmarks/feed_server.py
+#
+# Локальный сервер синтетических RSS/Atom-лент для бенчмарков RSSEye.
+# Отдельный запуск: python -m benchmarks.feed_server --feeds 2000 --port 8080
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from email.utils import format_datetime
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+from benchmarks.bench_matcher import random_word
+
+# Словарь достаточно велик, чтобы случайные тексты не были почти повторами друг друга
+VOCABULARY = [random_word(random.Random(i)) for i in range(5000)]
+DEFAULT_KEYWORDS = ("газпром", "сбербанк", "роснефть", "яндекс", "аэрофлот")
+
+
+class SyntheticFeeds:
+    """Набор синтетических лент.
+
+    У каждой ленты есть версия - номер последней записи; в ленте лежат
+    entries последних записей. При каждом запросе лента с вероятностью churn
+    получает new_entries новых записей. Чётные ленты отдаются как RSS 2.0,
+    нечётные - как Atom. Доля hit_rate записей содержит ключевое слово.
+    Ответ задерживается в среднем на latency секунд, доля error_rate
+    запросов получает 503. С etag=True ответы несут ETag, и совпавший
+    If-None-Match получает 304.
+    """
+
+    def __init__(
+        self,
+        feeds: int = 1000,
+        entries: int = 50,
+        churn: float = 0.2,
+        new_entries: int = 2,
+        latency: float = 0.05,
+        error_rate: float = 0.01,
+        etag: bool = True,
+        hit_rate: float = 0.1,
+        keywords: Sequence[str] = DEFAULT_KEYWORDS,
+        seed: int = 42
+    ):
+        self.feeds = feeds
+        self.entries = entries
+        self.churn = churn
+        self.new_entries = new_entries
+        self.latency = latency
+        self.error_rate = error_rate
+        self.etag = etag
+        self.hit_rate = hit_rate
+        self.keywords = list(keywords)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.versions = [entries] * feeds
+        self._bodies: Dict[int, Tuple[int, bytes]] = {}  # лента -> (версия, тело)
+        self.started = time.time()
+        self.stats = {"requests": 0, "ok": 0, "not_modified": 0, "errors": 0, "bytes": 0}
+
+    def _entry(self, feed: int, number: int) -> Dict:
+        rng = random.Random(f"{self.seed}:{feed}:{number}")
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(20, 60))]
+        if rng.random() < self.hit_rate:
+            words[rng.randrange(len(words))] = rng.choice(self.keywords).capitalize()
+        # Новые записи - на минуту позже предыдущих
+        published = datetime.fromtimestamp(self.started + (number - self.entries) * 60, tz=timezone.utc)
+        return {
+            "title": " ".join(words[:8]).capitalize(),
+            "summary": " ".join(words[8:]),
+            "link": f"http://feeds.local/{feed}/entries/{number}",
+            "published": published,
+        }
+
+    def render(self, feed: int) -> bytes:
+        version = self.versions[feed]
+        cached = self._bodies.get(feed)
+        if cached and cached[0] == version:
+            return cached[1]
+        entries = [self._entry(feed, number) for number in range(version, max(version - self.entries, 0), -1)]
+        if feed % 2 == 0:
+            items = "".join(
+                f"<item><title>{escape(e['title'])}</title><link>{e['link']}</link>"
+                f"<description>{escape(e['summary'])}</description>"
+                f"<pubDate>{format_datetime(e['published'])}</pubDate><guid>{e['link']}</guid></item>"
+                for e in entries
+            )
+            body = (
+                '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+                f"<title>Лента {feed}</title><link>http://feeds.local/{feed}</link>"
+                f"<description>Синтетическая лента</description>{items}</channel></rss>"
+            )
+        else:
+            items = "".join(
+                f"<entry><title>{escape(e['title'])}</title><link href=\"{e['link']}\"/>"
+                f"<id>{e['link']}</id><updated>{e['published'].isoformat()}</updated>"
+                f"<summary>{escape(e['summary'])}</summary></entry>"
+                for e in entries
+            )
+            body = (
+                '<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+                f"<title>Лента {feed}</title><id>http://feeds.local/{feed}</id>"
+                f"<updated>{entries[0]['published'].isoformat()}</updated>{items}</feed>"
+            )
+        data = body.encode("utf-8")
+        self._bodies[feed] = (version, data)
+        return data
+
+    async def handle_feed(self, request: web.Request) -> web.Response:
+        feed = int(request.match_info["feed"])
+        if not 0 <= feed < self.feeds:
+            raise web.HTTPNotFound()
+        self.stats["requests"] += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.latency))
+        if self.rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=503)
+        if self.rng.random() < self.churn:
+            self.versions[feed] += self.new_entries
+
+        headers = {}
+        if self.etag:
+            etag = f'"{feed}-{self.versions[feed]}"'
+            headers["ETag"] = etag
+            if request.headers.get("If-None-Match") == etag:
+                self.stats["not_modified"] += 1
+                return web.Response(status=304, headers=headers)
+        body = self.render(feed)
+        self.stats["ok"] += 1
+        self.stats["bytes"] += len(body)
+        content_type = "application/rss+xml" if feed % 2 == 0 else "application/atom+xml"
+        return web.Response(body=body, headers=headers, content_type=content_type, charset="utf-8")
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/feeds/{feed}.xml", self.handle_feed)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    @staticmethod
+    def urls(base_url: str, feeds: int) -> List[str]:
+        return [f"{base_url}/feeds/{feed}.xml" for feed in range(feeds)]
+
+
+async def serve(feeds: SyntheticFeeds, host: str, port: int, ready=None, stop: Optional[asyncio.Event] = None):
+    runner = web.AppRunner(feeds.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    if ready is not None:
+        ready.set()
+    try:
+        await (stop or asyncio.Event()).wait()
+    finally:
+        await runner.cleanup()
+
+
+def run_process(options: Dict, host: str, port: int, ready):
+    """Точка входа для запуска сервера в отдельном процессе"""
+    asyncio.run(serve(SyntheticFeeds(**options), host, port, ready))
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Параметры лент, общие для сервера и bench_rss"""
+    parser.add_argument("--feeds", type=int, default=1000)
+    parser.add_argument("--entries", type=int, default=50, help="Записей в ленте")
+    parser.add_argument("--churn", type=float, default=0.2, help="Вероятность новых записей при запросе")
+    parser.add_argument("--new-entries", type=int, default=2, help="Сколько записей добавляется за раз")
+    parser.add_argument("--latency", type=float, default=0.05, help="Средняя задержка ответа, секунд")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Доля ответов 503")
+    parser.add_argument("--no-etag", action="store_true", help="Не отдавать ETag и не отвечать 304")
+    parser.add_argument("--hit-rate", type=float, default=0.1, help="Доля записей с ключевым словом")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def feed_options(args: argparse.Namespace) -> Dict:
+    return {
+        "feeds": args.feeds,
+        "entries": args.entries,
+        "churn": args.churn,
+        "new_entries": args.new_entries,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "etag": not args.no_etag,
+        "hit_rate": args.hit_rate,
+        "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер синтетических RSS/Atom-лент")
+    add_arguments(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    print(json.dumps(feed_options(args), ensure_ascii=False))
+    print(f"Ленты: http://{args.host}:{args.port}/feeds/0.xml ... /feeds/{args.feeds - 1}.xml")
+    try:
+        asyncio.run(serve(SyntheticFeeds(**feed_options(args)), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/report.py
+#
+# Общие замеры бенчмарков и отчёт в JSON для сравнения запусков.
+
+import datetime
+import json
+import platform
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0..100) с линейной интерполяцией"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def latency_summary(seconds: List[float]) -> Dict:
+    """Сводка задержек в миллисекундах"""
+    return {
+        "count": len(seconds),
+        "mean_ms": round(sum(seconds) / len(seconds) * 1000, 3) if seconds else 0.0,
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "max_ms": round(max(seconds, default=0.0) * 1000, 3),
+    }
+
+
+class LatencyRecorder:
+    """Копит длительности операций по именам"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    @contextmanager
+    def measure(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append(time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def summary(self) -> Dict[str, Dict]:
+        return {name: latency_summary(samples) for name, samples in self.samples.items()}
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """Пиковый размер резидентной памяти процесса (или его завершённых потомков)"""
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux отдаёт КиБ, macOS - байты
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def write_report(benchmark: str, params: Dict, results: Dict, output: Optional[str] = None) -> Dict:
+    """Печатает отчёт в JSON и, если задан output, сохраняет его в файл"""
+    report = {
+        "benchmark": benchmark,
+        "finished_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": params,
+        "results": results,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_children_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    return report